@@ -0,0 +1,107 @@
+from asyncio import get_event_loop
+from collections import OrderedDict
+from numbers import Real
+from pathlib import Path
+from typing import Tuple
+
+from typeguard import check_argument_types
+
+from asphalt.filewatcher.api import (
+    FileWatcher, FilesystemEvent, DirectoryChangedEvent, _event_types)
+
+__all__ = ('DirectoryAggregator',)
+
+
+class _Window:
+    __slots__ = 'count', 'counts', 'paths', 'handle'
+
+    def __init__(self, count: int = 0):
+        self.count = count
+        self.counts = {}  # Dict[FileEventType, int]
+        self.paths = OrderedDict()  # OrderedDict[Path, None]
+        self.handle = None
+
+
+class DirectoryAggregator:
+    """
+    Replaces bursts of events in a single directory with summary events.
+
+    Events are counted per directory (the parent of the affected path) within a time window that
+    starts with the first event. Once more than ``threshold`` events have been seen in a window,
+    the rest are held back. When the window ends, a single
+    :class:`~asphalt.filewatcher.api.DirectoryChangedEvent` summarizing the held back events is
+    delivered in their place, both through the watcher's ``directory_changed`` signal and to its
+    journal, publisher, dirty sets and executors. If the burst continues into the next window, all
+    of its events are summarized, until a window passes without any events.
+
+    Consumers should rescan the directory upon receiving a summary.
+
+    :param watcher: the file watcher whose events to aggregate
+    :param threshold: the number of events per directory and window to deliver individually
+    :param window: the length of the time window (in seconds)
+    :param include_paths: ``True`` to list the paths of the held back events in the summaries
+
+    :ivar int suppressed: the number of events held back so far
+    """
+
+    def __init__(self, watcher: FileWatcher, threshold: int, *, window: Real = 0.1,
+                 include_paths: bool = False):
+        assert check_argument_types()
+        if threshold < 1:
+            raise ValueError('threshold must be a positive integer')
+        if window <= 0:
+            raise ValueError('window must be positive')
+
+        self.watcher = watcher
+        self.threshold = threshold
+        self.window = window
+        self.include_paths = include_paths
+        self.suppressed = 0
+        self._windows = {}  # Dict[Tuple[Path, Path], _Window]
+
+    def __call__(self, event: FilesystemEvent) -> bool:
+        """
+        Count the event towards its directory's window.
+
+        :return: ``True`` if the event should be delivered, ``False`` if it was held back
+
+        """
+        key = event.root, event.path.parent
+        window = self._windows.get(key)
+        if window is None:
+            window = self._open_window(key)
+
+        window.count += 1
+        if window.count <= self.threshold:
+            return True
+
+        self.suppressed += 1
+        event_type = _event_types[event.topic]
+        window.counts[event_type] = window.counts.get(event_type, 0) + 1
+        if self.include_paths:
+            window.paths[event.path] = None
+
+        return False
+
+    def close(self) -> None:
+        """Discard all open windows without dispatching their summaries."""
+        for window in self._windows.values():
+            window.handle.cancel()
+
+        self._windows.clear()
+
+    def _open_window(self, key: Tuple[Path, Path], count: int = 0) -> _Window:
+        window = self._windows[key] = _Window(count)
+        window.handle = get_event_loop().call_later(self.window, self._close_window, key)
+        return window
+
+    def _close_window(self, key: Tuple[Path, Path]) -> None:
+        window = self._windows.pop(key)
+        if window.counts:
+            root, directory = key
+            paths = list(window.paths) if self.include_paths else None
+            self.watcher._deliver(DirectoryChangedEvent(
+                self.watcher, 'directory_changed', directory, window.counts, paths, root))
+
+            # The burst may still be going on, so keep summarizing
+            self._open_window(key, self.threshold)
@@ -1,13 +1,30 @@
+import logging
 from abc import abstractmethod, ABCMeta
+from asyncio import get_event_loop
 from enum import Enum
+from inspect import iscoroutine
 from pathlib import Path
-from typing import Union, Iterable
+from numbers import Real
+from typing import Union, Iterable, Callable, Sequence, Any, Dict, List, Optional, TYPE_CHECKING
 
 from typeguard import check_argument_types
 
 from asphalt.core import Event, Signal
 
-__all__ = ('FileEventType', 'FilesystemEvent', 'FileWatcher')
+from asphalt.filewatcher.patterns import PatternIndex
+from asphalt.filewatcher.ratelimit import RateLimiter, RateLimitRule
+
+if TYPE_CHECKING:
+    from asphalt.filewatcher.aggregation import DirectoryAggregator  # noqa: F401
+    from asphalt.filewatcher.dirtyset import DirtySet  # noqa: F401
+    from asphalt.filewatcher.executor import ShardedExecutor  # noqa: F401
+    from asphalt.filewatcher.journal import EventJournal  # noqa: F401
+    from asphalt.filewatcher.publisher import EventPublisher  # noqa: F401
+
+__all__ = ('FileEventType', 'FilesystemEvent', 'InitialScanEvent', 'DirectoryChangedEvent',
+           'FileWatcher')
+
+logger = logging.getLogger(__name__)
 
 
 class FileEventType(Enum):
@@ -16,42 +33,395 @@ class FileEventType(Enum):
     create = 2
     delete = 3
     modify = 4
+    #: a file that was written to is now complete (closed by the writer, or unchanged for a while
+    #: with backends that cannot detect that)
+    settle = 5
 
 FileEventType.all = tuple(FileEventType.__members__.values())
 
+#: maps event types to the names of the corresponding signals on :class:`FileWatcher`
+_topics = {
+    FileEventType.access: 'accessed',
+    FileEventType.attribute: 'attribute_changed',
+    FileEventType.create: 'created',
+    FileEventType.delete: 'deleted',
+    FileEventType.modify: 'modified',
+    FileEventType.settle: 'settled'
+}
+_event_types = {topic: event_type for event_type, topic in _topics.items()}
+
 
 class FilesystemEvent(Event):
-    __slots__ = 'path'
+    """
+    :ivar Path path: path of the affected file or directory, relative to ``root``
+    :ivar Path root: the watched root path the event came from
+    """
+
+    __slots__ = 'path', 'root'
 
-    def __init__(self, source: 'FileWatcher', topic: str, path: Path):
+    def __init__(self, source: 'FileWatcher', topic: str, path: Path, root: Path = None):
         super().__init__(source, topic)
         self.path = path
+        self.root = source.path if root is None else root
 
     @property
     def fullpath(self) -> Path:
-        return self.source.path / self.path
+        return self.root / self.path
+
+
+class InitialScanEvent(Event):
+    """
+    Dispatched once for each root path after the watcher has started, listing the entries that
+    already existed.
+
+    :ivar paths: paths of the existing files and directories, relative to ``root``
+    :vartype paths: Sequence[Path]
+    :ivar Path root: the watched root path that was scanned
+    """
+
+    __slots__ = 'paths', 'root'
+
+    def __init__(self, source: 'FileWatcher', topic: str, paths: Sequence[Path],
+                 root: Path = None):
+        super().__init__(source, topic)
+        self.paths = paths
+        self.root = source.path if root is None else root
+
+
+class DirectoryChangedEvent(Event):
+    """
+    Dispatched in place of a burst of events in a single directory (see
+    :meth:`FileWatcher.aggregate_directories`).
+
+    :ivar Path path: path of the directory, relative to ``root``
+    :ivar counts: the number of events of each type that were held back
+    :vartype counts: Dict[FileEventType, int]
+    :ivar paths: the relative paths affected by the held back events (``None`` unless the
+        aggregator was configured to include them)
+    :vartype paths: Optional[List[Path]]
+    :ivar Path root: the watched root path the events came from
+    """
+
+    __slots__ = 'path', 'counts', 'paths', 'root'
+
+    def __init__(self, source: 'FileWatcher', topic: str, path: Path,
+                 counts: Dict[FileEventType, int], paths: Optional[List[Path]] = None,
+                 root: Path = None):
+        super().__init__(source, topic)
+        self.path = path
+        self.counts = counts
+        self.paths = paths
+        self.root = source.path if root is None else root
+
+    @property
+    def fullpath(self) -> Path:
+        return self.root / self.path
 
 
 class FileWatcher(metaclass=ABCMeta):
+    """
+    Base class for file system watchers.
+
+    :param path: the file or directory to watch, or an iterable of them (the roots must not
+        overlap)
+    :param events: the event types to watch for
+    :param recursive: ``True`` to watch for changes in subdirectories as well
+    :param report_existing: ``True`` to report the existing entries through the :attr:`scanned`
+        signal when the watcher is started
+
+    :ivar Tuple[Path, ...] paths: the watched root paths
+    :ivar Path path: the first (or only) watched root path
+    :ivar aggregator: the directory aggregator (if one has been set up with
+        :meth:`aggregate_directories`)
+    :vartype aggregator: Optional[~asphalt.filewatcher.aggregation.DirectoryAggregator]
+    :ivar rate_limiter: the rate limiter (if any rate limits have been set with
+        :meth:`limit_rate`)
+    :vartype rate_limiter: Optional[~asphalt.filewatcher.ratelimit.RateLimiter]
+    :ivar journal: the event journal (if one has been opened with :meth:`open_journal`)
+    :vartype journal: Optional[~asphalt.filewatcher.journal.EventJournal]
+    :ivar publisher: the event publisher (if one has been created with :meth:`publish`)
+    :vartype publisher: Optional[~asphalt.filewatcher.publisher.EventPublisher]
+    """
+
     accessed = Signal(FilesystemEvent)
     created = Signal(FilesystemEvent)
     attribute_changed = Signal(FilesystemEvent)
     deleted = Signal(FilesystemEvent)
     modified = Signal(FilesystemEvent)
+    settled = Signal(FilesystemEvent)
+    scanned = Signal(InitialScanEvent)
+    directory_changed = Signal(DirectoryChangedEvent)
 
-    def __init__(self, path: Union[str, Path], events: Iterable[FileEventType] = FileEventType.all,
-                 recursive: bool = True):
+    def __init__(self, path: Union[str, Path, Iterable[Union[str, Path]]],
+                 events: Iterable[FileEventType] = FileEventType.all, recursive: bool = True,
+                 report_existing: bool = False):
         assert check_argument_types()
-        self.path = Path(path)
+        if isinstance(path, (str, Path)):
+            self.paths = (Path(path),)
+        else:
+            self.paths = tuple(Path(p) for p in path)
+            if not self.paths:
+                raise ValueError('no paths to watch specified')
+
+        for i, path in enumerate(self.paths):
+            for other in self.paths[i + 1:]:
+                if path == other or path in other.parents or other in path.parents:
+                    raise ValueError('overlapping watched paths: {} and {}'.format(path, other))
+
+        self.path = self.paths[0]
         self.events = set(events)
-        self.recursive = recursive and self.path.is_dir()
+        self.recursive = recursive and any(path.is_dir() for path in self.paths)
+        self.report_existing = report_existing
         if not events:
             raise ValueError('no watched event types specified')
 
+        self.aggregator = None
+        self.rate_limiter = None
+        self.journal = None
+        self.publisher = None
+        self._sinks = []  # List[Callable[[Union[FilesystemEvent, DirectoryChangedEvent]], Any]]
+        self._pattern_indexes = {}  # Dict[str, PatternIndex]
+
     @abstractmethod
     def start(self) -> None:
-        """Start watching the given file or directory for changes."""
+        """
+        Start watching the given files or directories for changes.
+
+        If ``report_existing`` was enabled, the entries found while setting up the watch are
+        dispatched through the :attr:`scanned` signal (once per root path) once the watch is in
+        place. Any changes made after that are guaranteed to be reported as regular events.
+
+        """
 
     @abstractmethod
     def stop(self) -> None:
         """Stop watching filesystem events."""
+
+    def offload(self, func: Callable[[str, Path], None], **kwargs) -> 'ShardedExecutor':
+        """
+        Process the events from this watcher in a thread or process pool.
+
+        This is meant for listeners that do blocking or CPU intensive work, like parsing the
+        changed files. Events for the same path are processed one at a time, in the order they
+        were dispatched, while events for different paths are processed in parallel.
+
+        If the events arrive faster than they can be processed, so that ``max_in_flight`` events
+        are queued or running, the executor holds back further events and only keeps the latest
+        one for each path until the backlog has been worked down. Events are thus lost while
+        overloaded (see :attr:`~asphalt.filewatcher.executor.ShardedExecutor.dropped`), so the
+        callable should not assume that it sees every event for a path.
+
+        :param func: a callable that receives the event topic (e.g. ``created``) and the full path
+            of the affected file or directory
+        :param kwargs: keyword arguments passed to
+            :class:`~asphalt.filewatcher.executor.ShardedExecutor`
+        :return: the executor (call its :meth:`~asphalt.filewatcher.executor.ShardedExecutor.close`
+            method to stop processing events)
+
+        """
+        from asphalt.filewatcher.executor import ShardedExecutor
+
+        assert check_argument_types()
+        return ShardedExecutor(self, func, **kwargs)
+
+    def track_dirty(self, **kwargs) -> 'DirtySet':
+        """
+        Start collecting the set of paths changed by the events from this watcher.
+
+        This is meant for consumers that only need to know what has changed since they last
+        looked (like cache invalidation), rather than every individual event. Any number of
+        dirty sets can be tracked independently of each other.
+
+        :param kwargs: keyword arguments passed to :class:`~asphalt.filewatcher.dirtyset.DirtySet`
+        :return: the dirty set (call its :meth:`~asphalt.filewatcher.dirtyset.DirtySet.close`
+            method to stop collecting paths)
+
+        """
+        from asphalt.filewatcher.dirtyset import DirtySet
+
+        assert check_argument_types()
+        return DirtySet(self, **kwargs)
+
+    def open_journal(self, directory: Union[str, Path], **kwargs) -> 'EventJournal':
+        """
+        Start recording the events from this watcher in a journal.
+
+        The journal lets consumers replay the events they missed (e.g. while restarting or falling
+        behind) without running a watcher of their own. It is made available as :attr:`journal`.
+
+        :param directory: the directory to store the journal segments in
+        :param kwargs: keyword arguments passed to
+            :class:`~asphalt.filewatcher.journal.EventJournal`
+        :return: the journal
+
+        """
+        from asphalt.filewatcher.journal import EventJournal
+
+        assert check_argument_types()
+        if self.journal is not None:
+            raise RuntimeError('a journal has already been opened for this watcher')
+
+        self.journal = EventJournal(self, directory, **kwargs)
+        return self.journal
+
+    def publish(self, socket_path: Union[str, Path], **kwargs) -> 'EventPublisher':
+        """
+        Create a publisher that streams the events from this watcher to other processes.
+
+        Other processes can then receive the events using the ``subscriber`` backend instead of
+        watching the file system themselves. The publisher is made available as
+        :attr:`publisher`, and must be started with its
+        :meth:`~asphalt.filewatcher.publisher.EventPublisher.start` method.
+
+        :param socket_path: path to the UNIX domain socket to listen on
+        :param kwargs: keyword arguments passed to
+            :class:`~asphalt.filewatcher.publisher.EventPublisher`
+        :return: the publisher
+
+        """
+        from asphalt.filewatcher.publisher import EventPublisher
+
+        assert check_argument_types()
+        if self.publisher is not None:
+            raise RuntimeError('a publisher has already been created for this watcher')
+
+        self.publisher = EventPublisher(self, socket_path, **kwargs)
+        return self.publisher
+
+    def subscribe(self, topic: str, callback: Callable[[FilesystemEvent], Any], *,
+                  pattern: str) -> Callable[[FilesystemEvent], Any]:
+        """
+        Connect a callback to the events of the given topic, for paths matching a glob pattern.
+
+        This is much cheaper than connecting a listener to the signal and filtering the events in
+        the callback, as the patterns are looked up from an index instead of having every
+        listener check every event. Callbacks are called directly (without a task of their own);
+        any coroutines they return are run as tasks.
+
+        The pattern is matched against the path relative to the root (see
+        :func:`~asphalt.filewatcher.patterns.translate` for the syntax).
+
+        :param topic: the event topic (signal name, like ``modified``)
+        :param callback: a callable that will receive the event as its only argument
+        :param pattern: a glob pattern like ``*.py``, ``**/*.yaml`` or ``config/**``
+        :return: the value of ``callback``
+
+        """
+        assert check_argument_types()
+        if topic not in _topics.values():
+            raise ValueError('invalid topic: {}'.format(topic))
+
+        if not self._pattern_indexes:
+            self._sinks.append(self._route)
+
+        self._pattern_indexes.setdefault(topic, PatternIndex()).add(pattern, callback)
+        return callback
+
+    def unsubscribe(self, topic: str, callback: Callable[[FilesystemEvent], Any], *,
+                    pattern: str = None) -> None:
+        """
+        Disconnect a callback connected with :meth:`subscribe`.
+
+        :param topic: the event topic
+        :param callback: the callback to disconnect
+        :param pattern: the pattern to disconnect the callback from, or ``None`` to disconnect it
+            from all patterns
+
+        """
+        assert check_argument_types()
+        index = self._pattern_indexes.get(topic)
+        if index is not None:
+            index.remove(callback, pattern)
+            if not index:
+                del self._pattern_indexes[topic]
+                if not self._pattern_indexes:
+                    self._sinks.remove(self._route)
+
+    def aggregate_directories(self, threshold: int, **kwargs) -> 'DirectoryAggregator':
+        """
+        Replace bursts of events in a single directory with summary events.
+
+        When more than ``threshold`` events hit a single directory within a time window, the
+        rest of them are held back and summarized in a single :class:`DirectoryChangedEvent`,
+        dispatched through the :attr:`directory_changed` signal (and to the journal, publisher,
+        dirty sets and executors) when the window ends. This keeps
+        operations like ``git checkout`` or unpacking an archive from flooding the listeners.
+        The aggregator is made available as :attr:`aggregator`.
+
+        :param threshold: the number of events per directory and window to deliver individually
+        :param kwargs: keyword arguments passed to
+            :class:`~asphalt.filewatcher.aggregation.DirectoryAggregator`
+        :return: the aggregator
+
+        """
+        from asphalt.filewatcher.aggregation import DirectoryAggregator
+
+        assert check_argument_types()
+        if self.aggregator is not None:
+            raise RuntimeError('directory aggregation has already been set up for this watcher')
+
+        self.aggregator = DirectoryAggregator(self, threshold, **kwargs)
+        return self.aggregator
+
+    def limit_rate(self, rate: Real, *, burst: int = 1, pattern: str = None,
+                   shared: bool = False) -> RateLimitRule:
+        """
+        Limit the rate of events delivered for the paths matching the given pattern.
+
+        Each path gets its own token bucket, unless ``shared`` is ``True``. Events exceeding the
+        limit are suppressed, but the latest suppressed event of each type is delivered once the
+        limit allows it again. Rules are checked in the order they were added, and the first
+        matching rule applies.
+
+        :param rate: the number of events per second to allow, on average
+        :param burst: the number of events allowed to pass in quick succession
+        :param pattern: a glob pattern matched against relative paths (e.g. ``*.log``), with the
+            same syntax as in :meth:`subscribe`, or ``None`` to apply this limit to all paths
+        :param shared: ``True`` to have all matching paths share a single token bucket
+        :return: the rule object (which also tracks the number of suppressed events)
+
+        """
+        assert check_argument_types()
+        if self.rate_limiter is None:
+            self.rate_limiter = RateLimiter(self._deliver)
+
+        return self.rate_limiter.add_rule(rate, burst=burst, pattern=pattern, shared=shared)
+
+    def _dispatch(self, event_type: FileEventType, path: Path, root: Path = None) -> None:
+        """
+        Dispatch an event through the signal matching the event type and to all attached sinks.
+
+        Backends must call this instead of dispatching directly through the signals, as the event
+        may be subject to directory aggregation and rate limiting.
+
+        :param event_type: the type of the event
+        :param path: the affected path, relative to ``root``
+        :param root: the root path the event came from (defaults to the first root path)
+
+        """
+        topic = _topics[event_type]
+        event = FilesystemEvent(self, topic, path, root)
+        if self.aggregator is not None and not self.aggregator(event):
+            return
+
+        if self.rate_limiter is None or self.rate_limiter(event):
+            self._deliver(event)
+
+    def _deliver(self, event: Union[FilesystemEvent, DirectoryChangedEvent]) -> None:
+        getattr(self, event.topic).dispatch_event(event)
+        for sink in self._sinks:
+            sink(event)
+
+    def _route(self, event: FilesystemEvent) -> None:
+        index = self._pattern_indexes.get(event.topic)
+        if index is None:
+            return
+
+        for callback in index.match(event.path.as_posix()):
+            try:
+                retval = callback(event)
+            except Exception:
+                logger.exception('uncaught exception in event listener')
+            else:
+                if iscoroutine(retval):
+                    get_event_loop().create_task(retval)
@@ -23,18 +23,32 @@ else:
     default_backend = 'poll'
 
 
-def create_watcher(path: Union[str, Path], events: Union[str, Iterable[FileEventType]], *,
-                   recursive: bool = True, backend: str = None, **kwargs):
+def create_watcher(path: Union[str, Path, Iterable[Union[str, Path]]],
+                   events: Union[str, Iterable[FileEventType]], *, recursive: bool = True,
+                   backend: str = None, aggregate: Dict[str, Any] = None,
+                   rate_limits: Iterable[Dict[str, Any]] = (), journal: Dict[str, Any] = None,
+                   publish: Union[str, Path] = None, **kwargs):
     """
     Create a new file system watcher.
 
     If no backend name is explicitly given, the best default backend for the current platform is
     used.
 
-    :param path: path to the directory to watch
+    Watching several directories with a single watcher is cheaper than creating a watcher for each
+    one, as they share the same underlying resources (inotify descriptor, polling task etc.).
+
+    :param path: path to the directory to watch, or an iterable of such paths
     :param events: either a comma separated string or iterable of event types to watch
     :param recursive: ``True`` to watch for changes in subdirectories as well
     :param backend: name of the backend plugin (from the ``asphalt.watcher.watchers`` namespace)
+    :param aggregate: keyword arguments to
+        :meth:`~asphalt.filewatcher.api.FileWatcher.aggregate_directories`
+    :param rate_limits: an iterable of dictionaries of keyword arguments to
+        :meth:`~asphalt.filewatcher.api.FileWatcher.limit_rate`
+    :param journal: keyword arguments to :meth:`~asphalt.filewatcher.api.FileWatcher.open_journal`
+        to record the watcher's events in a journal
+    :param publish: path of a UNIX domain socket to publish the watcher's events on, for
+        ``subscriber`` watchers in other processes
 
     """
     assert check_argument_types()
@@ -42,7 +56,20 @@ def create_watcher(path: Union[str, Path], events: Union[str, Iterable[FileEvent
         events = [getattr(FileEventType, name.strip()) for name in events.split(',')]
 
     watcher_class = watchers.resolve(backend or default_backend)
-    return watcher_class(path, events=set(events), recursive=recursive, **kwargs)
+    watcher = watcher_class(path, events=set(events), recursive=recursive, **kwargs)
+    if aggregate is not None:
+        watcher.aggregate_directories(**aggregate)
+
+    for rate_limit in rate_limits:
+        watcher.limit_rate(**rate_limit)
+
+    if journal is not None:
+        watcher.open_journal(**journal)
+
+    if publish is not None:
+        watcher.publish(publish)
+
+    return watcher
 
 
 class FileWatcherComponent(Component):
@@ -80,11 +107,26 @@ class FileWatcherComponent(Component):
     @staticmethod
     async def shutdown(event, watcher, resource_name):
         watcher.stop()
+        if watcher.aggregator is not None:
+            watcher.aggregator.close()
+
+        if watcher.rate_limiter is not None:
+            watcher.rate_limiter.close()
+
+        if watcher.publisher is not None:
+            watcher.publisher.close()
+
+        if watcher.journal is not None:
+            watcher.journal.close()
+
         logger.info('File system watcher (%s) shut down', resource_name)
 
     async def start(self, ctx: Context):
         for resource_name, context_attr, watcher in self.watchers:
-            await watcher.start(ctx)
+            watcher.start()
+            if watcher.publisher is not None:
+                await watcher.publisher.start()
+
             ctx.publish_resource(watcher, resource_name, context_attr)
             ctx.finished.connect(
                 partial(self.shutdown, watcher=watcher, resource_name=resource_name))
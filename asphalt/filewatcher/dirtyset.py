@@ -0,0 +1,96 @@
+from asyncio import Event as AsyncEvent
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Dict, Set, Union
+
+from typeguard import check_argument_types
+
+from asphalt.filewatcher.api import (
+    FileWatcher, FilesystemEvent, DirectoryChangedEvent, FileEventType, _event_types)
+
+__all__ = ('DirtySet',)
+
+
+class DirtySet:
+    """
+    Collects the paths changed by the events from a file watcher, for consumers that only need to
+    know what has changed since they last looked.
+
+    Each path is only recorded once, along with the union of the types of events received for it,
+    so memory use is bounded by the number of distinct paths rather than the number of events. A
+    storm of events can then be processed as a single batch by calling :meth:`drain`.
+
+    Paths are recorded as full paths (root path joined with the relative path), in the order they
+    first became dirty. A directory summary (see
+    :meth:`~asphalt.filewatcher.api.FileWatcher.aggregate_directories`) marks the directory itself
+    dirty, with the types of the events it summarizes.
+
+    :param watcher: the file watcher to receive events from
+    :param events: the event types to record (defaults to all the types the watcher watches)
+    """
+
+    def __init__(self, watcher: FileWatcher, *, events: Iterable[FileEventType] = None):
+        assert check_argument_types()
+        self.watcher = watcher
+        self.events = frozenset(events or watcher.events)
+        self._paths = OrderedDict()  # Dict[Path, Set[FileEventType]]
+        self._dirty = AsyncEvent()
+        self._closed = False
+        watcher._sinks.append(self._add)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def drain(self) -> Dict[Path, Set[FileEventType]]:
+        """
+        Return the dirty paths and clear the set.
+
+        :return: an ordered dictionary of full path ⭢ set of event types received for that path
+
+        """
+        paths, self._paths = self._paths, OrderedDict()
+        self._dirty.clear()
+        return paths
+
+    async def wait_dirty(self) -> None:
+        """
+        Wait until at least one path is dirty (returns immediately if one already is).
+
+        :raises RuntimeError: if the set is closed (before or while waiting) and no dirty paths
+            are left to drain
+
+        """
+        # Another waiter may have drained the set before this one got to run
+        while not self._paths:
+            if self._closed:
+                raise RuntimeError('the dirty set has been closed')
+
+            await self._dirty.wait()
+
+    def close(self) -> None:
+        """
+        Stop recording paths.
+
+        The currently dirty paths can still be drained. Any tasks waiting in :meth:`wait_dirty`
+        are woken up.
+
+        """
+        if not self._closed:
+            self._closed = True
+            self.watcher._sinks.remove(self._add)
+            self._dirty.set()
+
+    def _add(self, event: Union[FilesystemEvent, DirectoryChangedEvent]) -> None:
+        if isinstance(event, DirectoryChangedEvent):
+            new_types = self.events.intersection(event.counts)
+        else:
+            new_types = self.events.intersection((_event_types[event.topic],))
+
+        if new_types:
+            path = event.fullpath
+            event_types = self._paths.get(path)
+            if event_types is None:
+                self._paths[path] = set(new_types)
+                self._dirty.set()
+            else:
+                event_types.update(new_types)
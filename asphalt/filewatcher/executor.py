@@ -0,0 +1,178 @@
+import logging
+from asyncio import get_event_loop
+from collections import deque, OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Union
+
+from typeguard import check_argument_types
+
+from asphalt.filewatcher.api import (
+    FileWatcher, FilesystemEvent, DirectoryChangedEvent, FileEventType, _topics)
+
+__all__ = ('ShardedExecutor',)
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedExecutor:
+    """
+    Processes file system events in a thread or process pool.
+
+    Each event is assigned to a shard by the hash of its path. A shard only ever has one event
+    being processed at a time and processes its events in the order they were dispatched, so
+    events for the same path are always processed sequentially and in order. Events in different
+    shards are processed in parallel.
+
+    The callable is called with the event topic (``created``, ``modified`` etc.) and the full path
+    of the affected file or directory. Directory summaries (see
+    :meth:`~asphalt.filewatcher.api.FileWatcher.aggregate_directories`) are passed on as
+    ``directory_changed`` for the directory, if they include any of the processed event types.
+    When using a process pool, the callable must be picklable.
+
+    If the number of queued and running events reaches ``max_in_flight``, the executor becomes
+    overloaded and further events are held back, keeping only the latest event for each path (much
+    like the rate limiter does), until the backlog has been worked down. This means that the
+    intermediate events for a path are lost while overloaded. A warning is logged once when
+    entering the overloaded state, and the number of lost events when leaving it.
+
+    :param watcher: the file watcher to receive events from
+    :param func: the callable to process events with
+    :param events: the event types to process (defaults to all the types the watcher watches)
+    :param concurrency: number of shards (and the maximum number of events processed in parallel)
+    :param max_in_flight: maximum number of events queued or being processed at any time
+        (excluding the events held back while overloaded)
+    :param executor: ``thread`` or ``process`` to create a new pool of the respective type, or an
+        existing :class:`~concurrent.futures.Executor`
+
+    :ivar int dropped: the number of events lost so far by being replaced with a later event for
+        the same path while overloaded
+    """
+
+    def __init__(self, watcher: FileWatcher, func: Callable[[str, Path], None], *,
+                 events: Iterable[FileEventType] = None, concurrency: int = 4,
+                 max_in_flight: int = 1000, executor: Union[str, Executor] = 'thread'):
+        assert check_argument_types()
+        if concurrency < 1:
+            raise ValueError('concurrency must be a positive integer')
+        if max_in_flight < concurrency:
+            raise ValueError('max_in_flight must be at least as large as concurrency')
+
+        self.watcher = watcher
+        self.func = func
+        self.topics = frozenset(_topics[event_type] for event_type in (events or watcher.events))
+        self.concurrency = concurrency
+        self.max_in_flight = max_in_flight
+        self.dropped = 0
+        self._dropped_before_overload = 0
+        self._in_flight = 0
+        self._held_back = OrderedDict()  # OrderedDict[Path, Tuple[int, str]]
+        self._queues = [deque() for _ in range(concurrency)]
+        self._busy = [False] * concurrency
+        self._closed = False
+        if executor == 'thread':
+            self._executor = ThreadPoolExecutor(concurrency)
+            self._owns_executor = True
+        elif executor == 'process':
+            self._executor = ProcessPoolExecutor(concurrency)
+            self._owns_executor = True
+        elif isinstance(executor, Executor):
+            self._executor = executor
+            self._owns_executor = False
+        else:
+            raise ValueError('executor must be "thread", "process" or an Executor instance')
+
+        watcher._sinks.append(self._submit)
+
+    @property
+    def in_flight(self) -> int:
+        """The number of events currently queued or being processed."""
+        return self._in_flight
+
+    @property
+    def overloaded(self) -> bool:
+        """``True`` if events are being held back because of too many events in flight."""
+        return bool(self._held_back)
+
+    def close(self) -> None:
+        """
+        Stop receiving events from the watcher and discard any queued or held back events.
+
+        Events already being processed are allowed to finish. If the executor was created by this
+        object, it is shut down.
+
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        self.watcher._sinks.remove(self._submit)
+        for queue in self._queues:
+            self._in_flight -= len(queue)
+            queue.clear()
+
+        self._held_back.clear()
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    def _submit(self, event: Union[FilesystemEvent, DirectoryChangedEvent]) -> None:
+        if isinstance(event, DirectoryChangedEvent):
+            if not any(_topics[event_type] in self.topics for event_type in event.counts):
+                return
+        elif event.topic not in self.topics:
+            return
+
+        shard = hash(event.path) % self.concurrency
+        path = event.fullpath
+        if self._held_back or self._in_flight >= self.max_in_flight:
+            # Keep only the latest event for each path until the backlog has been worked down
+            if not self._held_back:
+                self._dropped_before_overload = self.dropped
+                logger.warning('too many events in flight (%d); holding back further events '
+                               'until the backlog has been worked down', self._in_flight)
+            elif path in self._held_back:
+                self.dropped += 1
+
+            self._held_back[path] = shard, event.topic
+            return
+
+        self._enqueue(shard, event.topic, path)
+
+    def _enqueue(self, shard: int, topic: str, path: Path) -> None:
+        self._in_flight += 1
+        self._queues[shard].append((topic, path))
+        if not self._busy[shard]:
+            self._run_next(shard)
+
+    def _release_held_back(self) -> None:
+        while self._held_back and self._in_flight < self.max_in_flight:
+            path, (shard, topic) = self._held_back.popitem(last=False)
+            self._enqueue(shard, topic, path)
+
+        if not self._held_back:
+            logger.info('backlog of events worked down; %d events were lost while overloaded',
+                        self.dropped - self._dropped_before_overload)
+
+    def _run_next(self, shard: int) -> None:
+        queue = self._queues[shard]
+        if queue:
+            self._busy[shard] = True
+            topic, path = queue.popleft()
+            future = get_event_loop().run_in_executor(self._executor, self.func, topic, path)
+            future.add_done_callback(lambda f: self._job_done(shard, topic, path, f))
+        else:
+            self._busy[shard] = False
+
+    def _job_done(self, shard: int, topic: str, path: Path, future) -> None:
+        self._in_flight -= 1
+        if not future.cancelled() and future.exception() is not None:
+            logger.error('error processing %s event for %s', topic, path,
+                         exc_info=future.exception())
+
+        if self._closed:
+            self._busy[shard] = False
+        else:
+            if self._held_back:
+                self._release_held_back()
+
+            self._run_next(shard)
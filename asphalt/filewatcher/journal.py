@@ -0,0 +1,338 @@
+import mmap
+import os
+import struct
+from asyncio import get_event_loop, sleep, Event as AsyncEvent
+from pathlib import Path
+from typing import Union, Iterator, Tuple, List
+
+from async_generator import async_generator, yield_
+from typeguard import check_argument_types
+
+from asphalt.core import Event
+
+from asphalt.filewatcher.api import (
+    FileWatcher, FilesystemEvent, DirectoryChangedEvent, FileEventType, _topics, _event_types)
+
+__all__ = ('EventJournal',)
+
+#: sequence number, timestamp, event type, root index, length of the encoded path
+_record_header = struct.Struct('<QdBHH')
+#: event type value of directory summary records, where the path is followed by a summary
+_summary_type = 0xff
+#: number of event type counts, whether paths are included, number of paths
+_summary_header = struct.Struct('<B?I')
+#: event type, number of events
+_summary_count = struct.Struct('<BI')
+#: length of an encoded path in a summary
+_summary_path = struct.Struct('<H')
+_segment_suffix = '.journal'
+
+
+def _encode_path(path: Path) -> bytes:
+    return str(path).encode('utf-8', errors='surrogateescape')
+
+
+def _decode_path(data) -> Path:
+    return Path(bytes(data).decode('utf-8', errors='surrogateescape'))
+
+
+def _encode_record(seq: int, event: Union[FilesystemEvent, DirectoryChangedEvent],
+                   root_index: int) -> bytes:
+    path = _encode_path(event.path)
+    if isinstance(event, DirectoryChangedEvent):
+        paths = [_encode_path(path) for path in event.paths or ()]
+        parts = [_record_header.pack(seq, event.time, _summary_type, root_index, len(path)), path,
+                 _summary_header.pack(len(event.counts), event.paths is not None, len(paths))]
+        parts.extend(_summary_count.pack(event_type.value, count)
+                     for event_type, count in event.counts.items())
+        for encoded_path in paths:
+            parts.append(_summary_path.pack(len(encoded_path)))
+            parts.append(encoded_path)
+
+        return b''.join(parts)
+
+    event_type = _event_types[event.topic]
+    return _record_header.pack(seq, event.time, event_type.value, root_index, len(path)) + path
+
+
+def _decode_summary(buffer, offset: int, size: int):
+    # Returns the offset after the summary and the summary, or None if it's incomplete
+    if offset + _summary_header.size > size:
+        return None
+
+    num_counts, has_paths, num_paths = _summary_header.unpack_from(buffer, offset)
+    offset += _summary_header.size
+    if offset + num_counts * _summary_count.size > size:
+        return None
+
+    counts = {}
+    for _ in range(num_counts):
+        type_value, count = _summary_count.unpack_from(buffer, offset)
+        counts[FileEventType(type_value)] = count
+        offset += _summary_count.size
+
+    paths = []
+    for _ in range(num_paths):
+        if offset + _summary_path.size > size:
+            return None
+
+        length, = _summary_path.unpack_from(buffer, offset)
+        offset += _summary_path.size
+        if offset + length > size:
+            return None
+
+        paths.append(_decode_path(buffer[offset:offset + length]))
+        offset += length
+
+    return offset, (counts, paths if has_paths else None)
+
+
+def _decode_records(buffer, offset: int = 0) -> Iterator[Tuple[int, int, tuple]]:
+    """
+    Decode complete records from the given buffer, starting at the given offset.
+
+    Yields tuples of (offset after the record, sequence number, record fields), where the record
+    fields are (timestamp, event type, root index, path, summary). For directory summaries, the
+    event type is ``None`` and the summary is a tuple of (counts, paths); for other records the
+    summary is ``None``. A partially written record at the end of the buffer is ignored.
+
+    :raises ValueError: if a record contains an unknown event type
+
+    """
+    size = len(buffer)
+    while offset + _record_header.size <= size:
+        seq, timestamp, type_value, root_index, path_length = \
+            _record_header.unpack_from(buffer, offset)
+        end = offset + _record_header.size + path_length
+        if end > size:
+            break
+
+        path = _decode_path(buffer[offset + _record_header.size:end])
+        if type_value == _summary_type:
+            result = _decode_summary(buffer, end, size)
+            if result is None:
+                break
+
+            offset, summary = result
+            yield offset, seq, (timestamp, None, root_index, path, summary)
+        else:
+            offset = end
+            yield offset, seq, (timestamp, FileEventType(type_value), root_index, path, None)
+
+
+def _make_event(source: FileWatcher, fields: tuple,
+                root: Path) -> Union[FilesystemEvent, DirectoryChangedEvent]:
+    """Create an event from decoded record fields."""
+    timestamp, event_type, _, path, summary = fields
+    if summary is None:
+        event = FilesystemEvent(source, _topics[event_type], path, root)
+    else:
+        counts, paths = summary
+        event = DirectoryChangedEvent(source, 'directory_changed', path, counts, paths, root)
+
+    event.time = timestamp
+    return event
+
+
+class EventJournal:
+    """
+    Appends the events from a file watcher to a binary log, for later replay.
+
+    The log is split into segment files which are named after the sequence number of their first
+    record. A new segment is started once the current one grows past ``segment_size`` bytes, and
+    the oldest segments are deleted if there are more than ``max_segments`` of them. When opening
+    an existing journal directory, sequence numbering continues from the last stored record.
+
+    Directory summaries (see
+    :meth:`~asphalt.filewatcher.api.FileWatcher.aggregate_directories`) are recorded along with
+    the regular events.
+
+    Writes are buffered and flushed once per event loop iteration. Replays decode the segments in
+    chunks of ``replay_chunk_size`` records, letting other tasks run in between.
+
+    :param watcher: the file watcher to record events from
+    :param directory: the directory to store the segment files in (created if necessary)
+    :param segment_size: the size (in bytes) after which a new segment is started
+    :param max_segments: the maximum number of segments to keep (``None`` = unlimited)
+    """
+
+    #: maximum number of records to decode at once while replaying
+    replay_chunk_size = 1000
+
+    def __init__(self, watcher: FileWatcher, directory: Union[str, Path], *,
+                 segment_size: int = 16 * 1024 * 1024, max_segments: int = None):
+        assert check_argument_types()
+        if segment_size < _record_header.size:
+            raise ValueError('segment_size is too small')
+        if max_segments is not None and max_segments < 1:
+            raise ValueError('max_segments must be a positive integer')
+
+        self.watcher = watcher
+        self.directory = Path(directory)
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self._root_indexes = {root: i for i, root in enumerate(watcher.paths)}
+        self._file = None
+        self._flush_handle = None
+        self._appended = AsyncEvent()
+        self._closed = False
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segments = self._list_segments()
+        self._last_seq = 0
+        if segments:
+            self._open_last_segment(*segments[-1])
+        else:
+            self._start_segment(1)
+
+        watcher._sinks.append(self._append)
+
+    @property
+    def last_seq(self) -> int:
+        """The sequence number of the last appended event (0 if the journal is empty)."""
+        return self._last_seq
+
+    def close(self) -> None:
+        """Stop recording events and close the journal, ending any replays in progress."""
+        if self._closed:
+            return
+
+        self._closed = True
+        self.watcher._sinks.remove(self._append)
+        self._flush()
+        self._file.close()
+        self._appended.set()
+
+    @async_generator
+    async def replay(self, from_seq: int = 1, *, follow: bool = False):
+        """
+        Iterate through the recorded events, starting from the given sequence number.
+
+        This method is meant for use with ``async for``. The segment files are read through
+        memory maps. If the requested events have already been deleted, replay starts from the
+        oldest available event.
+
+        :param from_seq: the sequence number of the first event to yield
+        :param follow: ``True`` to wait for new events after the recorded ones have been exhausted
+            (until the journal is closed), ``False`` to stop there
+        :return: an asynchronous iterator yielding tuples of (sequence number,
+            :class:`~asphalt.filewatcher.api.FilesystemEvent` or
+            :class:`~asphalt.filewatcher.api.DirectoryChangedEvent`)
+
+        """
+        assert check_argument_types()
+        if not self._closed:
+            self._flush()
+
+        current_seq = None  # first sequence number of the segment being read
+        offset = 0
+        while True:
+            segments = self._list_segments()
+            if current_seq not in dict(segments):
+                # Start from the segment containing from_seq (or the oldest one, if it was deleted)
+                older = [segment for segment in segments if segment[0] <= from_seq]
+                current_seq = (older[-1] if older else segments[0])[0]
+                offset = 0
+
+            # Yield the new records from the current segment, one chunk at a time
+            path = dict(segments)[current_seq]
+            while True:
+                records, next_offset = self._read_segment(path, offset, from_seq)
+                if next_offset == offset:
+                    break
+
+                offset = next_offset
+                for seq, event in records:
+                    from_seq = seq + 1
+                    await yield_((seq, event))
+
+                await sleep(0)
+
+            newer = [segment for segment in segments if segment[0] > current_seq]
+            if newer:
+                # The segment has been exhausted and a newer one exists
+                current_seq = newer[0][0]
+                offset = 0
+            elif follow and not self._closed:
+                await self._appended.wait()
+            else:
+                break
+
+    def _read_segment(self, path: Path, offset: int,
+                      from_seq: int) -> Tuple[List[Tuple[int, Event]], int]:
+        records = []
+        try:
+            with path.open('rb') as f:
+                if os.fstat(f.fileno()).st_size <= offset:
+                    return records, offset
+
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    records_left = self.replay_chunk_size
+                    for offset, seq, fields in _decode_records(buffer, offset):
+                        records_left -= 1
+                        if seq >= from_seq:
+                            root = self.watcher.paths[fields[2]]
+                            records.append((seq, _make_event(self.watcher, fields, root)))
+
+                        if not records_left:
+                            break
+        except FileNotFoundError:
+            pass  # the segment was deleted while we were reading it
+
+        return records, offset
+
+    def _list_segments(self) -> List[Tuple[int, Path]]:
+        segments = []
+        for path in self.directory.iterdir():
+            if path.suffix == _segment_suffix and path.stem.isdigit():
+                segments.append((int(path.stem), path))
+
+        return sorted(segments)
+
+    def _open_last_segment(self, first_seq: int, path: Path) -> None:
+        # Find the last complete record and cut off any partially written one after it
+        size = 0
+        self._last_seq = first_seq - 1
+        with path.open('rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    for size, self._last_seq, _ in _decode_records(buffer):
+                        pass
+
+        self._file = path.open('ab')
+        self._file.truncate(size)
+        self._segment_length = size
+
+    def _start_segment(self, first_seq: int) -> None:
+        if self._file is not None:
+            self._file.close()
+
+        path = self.directory / '{:020d}{}'.format(first_seq, _segment_suffix)
+        self._file = path.open('ab')
+        self._segment_length = 0
+        if self.max_segments is not None:
+            for _, path in self._list_segments()[:-self.max_segments]:
+                path.unlink()
+
+    def _append(self, event: Union[FilesystemEvent, DirectoryChangedEvent]) -> None:
+        if self._segment_length >= self.segment_size:
+            self._flush()
+            self._start_segment(self._last_seq + 1)
+
+        self._last_seq += 1
+        record = _encode_record(self._last_seq, event, self._root_indexes[event.root])
+        self._file.write(record)
+        self._segment_length += len(record)
+        if self._flush_handle is None:
+            self._flush_handle = get_event_loop().call_soon(self._flush)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        self._file.flush()
+
+        # Wake up any replays waiting for new events
+        self._appended.set()
+        self._appended = AsyncEvent()
@@ -0,0 +1,212 @@
+import re
+from itertools import count
+from typing import Callable, Any, List, Set
+
+__all__ = ('translate', 'PatternIndex')
+
+_wildcard_chars = frozenset('*?[')
+_suffix_pattern = re.compile(r'^(?:\*\*/)?\*(\.[^*?\[/]+)$')
+
+
+def translate(pattern: str) -> str:
+    """
+    Translate a glob pattern into a regular expression matching relative POSIX paths.
+
+    ``*`` matches any number of characters within a path component, ``?`` matches a single
+    character and ``[...]`` matches a character set, like with :mod:`fnmatch`. ``**`` matches any
+    number of path components. A pattern without any slashes matches the file name at any depth
+    (so ``*.py`` is equivalent to ``**/*.py``).
+
+    :param pattern: a glob pattern
+    :return: a regular expression (without anchors or capturing groups)
+
+    """
+    if '/' not in pattern:
+        pattern = '**/' + pattern
+
+    parts = []
+    i, length = 0, len(pattern)
+    while i < length:
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == length:
+            parts.append('(?:/.*)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            charset = pattern[i + 1:end].replace('\\', '\\\\')
+            if charset.startswith('!'):
+                charset = '^' + charset[1:]
+
+            parts.append('[{}]'.format(charset))
+            i = end + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+
+    return ''.join(parts)
+
+
+class _RegexBucket:
+    __slots__ = 'ids', 'sources', 'regexes', 'combined'
+
+    def __init__(self):
+        self.ids = []  # List[int]
+        self.sources = []  # List[str]
+        self.regexes = []  # List[Pattern]
+        self.combined = None
+
+    def add(self, subscription_id: int, pattern: str) -> None:
+        self.ids.append(subscription_id)
+        self.sources.append(translate(pattern))
+
+    def compile(self) -> None:
+        # A single regular expression of all the alternatives rules out most paths in one go
+        self.regexes = [re.compile(r'(?:{})\Z'.format(source), re.DOTALL)
+                        for source in self.sources]
+        if len(self.sources) > 1:
+            self.combined = re.compile(r'(?:{})\Z'.format('|'.join(self.sources)), re.DOTALL)
+
+    def match(self, path: str, ids: Set[int]) -> None:
+        if self.combined is None or self.combined.match(path):
+            for subscription_id, regex in zip(self.ids, self.regexes):
+                if regex.match(path):
+                    ids.add(subscription_id)
+
+
+class PatternIndex:
+    """
+    Finds the callbacks subscribed to glob patterns matching a given path.
+
+    To avoid having to test every pattern against every path, patterns are sorted into the
+    following tables:
+
+    * exact paths (patterns without wildcards)
+    * file names (patterns without wildcards or slashes, matching at any depth)
+    * file name suffixes (patterns like ``*.yaml`` or ``**/*.yaml``)
+    * patterns starting with a literal directory name (like ``config/**/*.yaml``), bucketed by
+      that name
+    * everything else
+
+    The first three are simple dictionary lookups. Of the rest, only the patterns in the bucket
+    of the path's first component and the patterns in the last table are candidates for a match.
+    Each group of candidates is first tested with a single combined regular expression, so paths
+    matching none of them are ruled out without testing the patterns one by one. The cost of a
+    lookup therefore grows with the number of candidate patterns, not the total number of
+    patterns.
+
+    The tables are rebuilt lazily after subscriptions have been added or removed.
+
+    See :func:`translate` for the supported pattern syntax.
+    """
+
+    def __init__(self):
+        self._subscriptions = {}  # Dict[int, Tuple[str, Callable]]
+        self._ids = count()
+        self._dirty = False
+        self._exact = {}  # Dict[str, List[int]]
+        self._names = {}  # Dict[str, List[int]]
+        self._suffixes = {}  # Dict[str, List[int]]
+        self._prefixed = {}  # Dict[str, _RegexBucket]
+        self._unprefixed = None
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def add(self, pattern: str, callback: Callable[..., Any]) -> None:
+        """Subscribe the callback to the paths matching the given pattern."""
+        self._subscriptions[next(self._ids)] = pattern, callback
+        self._dirty = True
+
+    def remove(self, callback: Callable[..., Any], pattern: str = None) -> None:
+        """
+        Remove the subscriptions of the given callback.
+
+        :param callback: the callback to remove
+        :param pattern: the pattern to remove the subscription for, or ``None`` to remove all of
+            the callback's subscriptions
+
+        """
+        for subscription_id, (sub_pattern, sub_callback) in list(self._subscriptions.items()):
+            if sub_callback == callback and pattern in (None, sub_pattern):
+                del self._subscriptions[subscription_id]
+                self._dirty = True
+
+    def match(self, path: str) -> List[Callable[..., Any]]:
+        """
+        Return the callbacks subscribed to patterns matching the given path.
+
+        Each callback is only returned once, in the order of subscription.
+
+        :param path: a relative path in POSIX format (e.g. ``config/app.yaml``)
+
+        """
+        if self._dirty:
+            self._rebuild()
+
+        name = path.rpartition('/')[2]
+        ids = set(self._exact.get(path, ()))
+        ids.update(self._names.get(name, ()))
+        if self._suffixes:
+            index = name.find('.')
+            while index >= 0:
+                ids.update(self._suffixes.get(name[index:], ()))
+                index = name.find('.', index + 1)
+
+        if self._prefixed:
+            bucket = self._prefixed.get(path.partition('/')[0])
+            if bucket is not None:
+                bucket.match(path, ids)
+
+        if self._unprefixed is not None:
+            self._unprefixed.match(path, ids)
+
+        callbacks = []
+        for subscription_id in sorted(ids):
+            callback = self._subscriptions[subscription_id][1]
+            if callback not in callbacks:
+                callbacks.append(callback)
+
+        return callbacks
+
+    def _rebuild(self) -> None:
+        self._exact, self._names, self._suffixes, self._prefixed = {}, {}, {}, {}
+        self._unprefixed = None
+        for subscription_id, (pattern, _) in sorted(self._subscriptions.items()):
+            suffix_match = _suffix_pattern.match(pattern)
+            if suffix_match:
+                self._suffixes.setdefault(suffix_match.group(1), []).append(subscription_id)
+            elif _wildcard_chars.isdisjoint(pattern):
+                table = self._exact if '/' in pattern else self._names
+                table.setdefault(pattern, []).append(subscription_id)
+            else:
+                prefix, slash, _ = pattern.partition('/')
+                if slash and _wildcard_chars.isdisjoint(prefix):
+                    bucket = self._prefixed.get(prefix)
+                    if bucket is None:
+                        bucket = self._prefixed[prefix] = _RegexBucket()
+                else:
+                    if self._unprefixed is None:
+                        self._unprefixed = _RegexBucket()
+
+                    bucket = self._unprefixed
+
+                bucket.add(subscription_id, pattern)
+
+        for bucket in self._prefixed.values():
+            bucket.compile()
+
+        if self._unprefixed is not None:
+            self._unprefixed.compile()
+
+        self._dirty = False
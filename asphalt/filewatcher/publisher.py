@@ -0,0 +1,120 @@
+import logging
+import os
+import struct
+from asyncio import get_event_loop, start_unix_server, StreamWriter
+from pathlib import Path
+from typing import Union
+
+from typeguard import check_argument_types
+
+from asphalt.filewatcher.api import FileWatcher, FilesystemEvent, DirectoryChangedEvent
+from asphalt.filewatcher.journal import _encode_record
+
+__all__ = ('EventPublisher',)
+
+logger = logging.getLogger(__name__)
+
+#: length of the frame payload, frame type
+_frame_header = struct.Struct('<IB')
+FRAME_ROOTS = 0
+FRAME_EVENTS = 1
+
+
+def _encode_roots(roots) -> bytes:
+    return b'\x00'.join(str(root).encode('utf-8', errors='surrogateescape') for root in roots)
+
+
+def _make_frame(frame_type: int, payload: bytes) -> bytes:
+    return _frame_header.pack(len(payload), frame_type) + payload
+
+
+class EventPublisher:
+    """
+    Streams the events from a file watcher to other processes over a UNIX domain socket.
+
+    This allows a single process to own the actual watcher while other processes receive the same
+    events using the ``subscriber`` backend
+    (:class:`~asphalt.filewatcher.watchers.subscriber.SubscriberFileWatcher`).
+
+    Upon connecting, each subscriber is sent the list of watched root paths. After that, the
+    events dispatched during each event loop iteration are sent as a single batch, each event
+    encoded in the same binary format as used in the event journal. Subscribers that fall more
+    than ``max_buffer_size`` bytes behind are disconnected.
+
+    :param watcher: the file watcher to publish events from
+    :param socket_path: path to the UNIX domain socket to listen on
+    :param max_buffer_size: maximum number of bytes to buffer for a single subscriber
+    """
+
+    def __init__(self, watcher: FileWatcher, socket_path: Union[str, Path], *,
+                 max_buffer_size: int = 16 * 1024 * 1024):
+        assert check_argument_types()
+        self.watcher = watcher
+        self.socket_path = Path(socket_path)
+        self.max_buffer_size = max_buffer_size
+        self._root_indexes = {root: i for i, root in enumerate(watcher.paths)}
+        self._server = None
+        self._writers = set()  # Set[StreamWriter]
+        self._batch = []  # List[bytes]
+        self._flush_handle = None
+        self._seq = 0
+
+    async def start(self) -> None:
+        """Start listening for subscriber connections and publishing events."""
+        try:
+            os.unlink(str(self.socket_path))
+        except FileNotFoundError:
+            pass
+
+        self._server = await start_unix_server(self._client_connected, str(self.socket_path))
+        self.watcher._sinks.append(self._append)
+
+    def close(self) -> None:
+        """Stop publishing events and disconnect all subscribers."""
+        if self._server is None:
+            return
+
+        self.watcher._sinks.remove(self._append)
+        self._flush()
+        self._server.close()
+        self._server = None
+        for writer in self._writers:
+            writer.close()
+
+        self._writers.clear()
+        try:
+            os.unlink(str(self.socket_path))
+        except FileNotFoundError:
+            pass
+
+    def _client_connected(self, reader, writer: StreamWriter) -> None:
+        writer.write(_make_frame(FRAME_ROOTS, _encode_roots(self.watcher.paths)))
+        self._writers.add(writer)
+        logger.debug('Subscriber connected to %s', self.socket_path)
+
+    def _append(self, event: Union[FilesystemEvent, DirectoryChangedEvent]) -> None:
+        self._seq += 1
+        self._batch.append(_encode_record(self._seq, event, self._root_indexes[event.root]))
+        if self._flush_handle is None:
+            self._flush_handle = get_event_loop().call_soon(self._flush)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if not self._batch:
+            return
+
+        frame = _make_frame(FRAME_EVENTS, b''.join(self._batch))
+        del self._batch[:]
+        for writer in list(self._writers):
+            if writer.transport.is_closing():
+                self._writers.discard(writer)
+            elif writer.transport.get_write_buffer_size() > self.max_buffer_size:
+                logger.warning('Disconnecting a subscriber from %s: it has fallen too far behind',
+                               self.socket_path)
+                self._writers.discard(writer)
+                writer.close()
+            else:
+                writer.write(frame)
@@ -0,0 +1,194 @@
+import re
+from asyncio import get_event_loop
+from collections import OrderedDict
+from numbers import Real
+from typing import Callable, Optional, TYPE_CHECKING
+
+from typeguard import check_argument_types
+
+from asphalt.filewatcher.patterns import translate
+
+if TYPE_CHECKING:
+    from asphalt.filewatcher.api import FilesystemEvent  # noqa: F401
+
+__all__ = ('RateLimitRule', 'RateLimiter')
+
+
+class RateLimitRule:
+    """
+    A token bucket rate limit for the paths matching a pattern.
+
+    :ivar str pattern: the glob pattern matched against relative paths (see
+        :func:`~asphalt.filewatcher.patterns.translate` for the syntax), or ``None`` to match all
+        paths
+    :ivar float rate: the number of events per second allowed to pass, on average
+    :ivar int burst: the number of events allowed to pass in quick succession
+    :ivar bool shared: ``True`` if all matching paths share a single token bucket
+    :ivar int suppressed: the number of events suppressed by this rule so far
+    """
+
+    __slots__ = 'pattern', 'rate', 'burst', 'shared', 'suppressed', '_regex'
+
+    def __init__(self, pattern: Optional[str], rate: Real, burst: int, shared: bool):
+        self.pattern = pattern
+        self.rate = rate
+        self.burst = burst
+        self.shared = shared
+        self.suppressed = 0
+        self._regex = (re.compile(r'(?:{})\Z'.format(translate(pattern)), re.DOTALL)
+                       if pattern is not None else None)
+
+    def matches(self, event: 'FilesystemEvent') -> bool:
+        return self._regex is None or self._regex.match(event.path.as_posix()) is not None
+
+    def __repr__(self):
+        return ('{0.__class__.__name__}(pattern={0.pattern!r}, rate={0.rate}, burst={0.burst}, '
+                'shared={0.shared}, suppressed={0.suppressed})'.format(self))
+
+
+class _TokenBucket:
+    __slots__ = 'rule', 'tokens', 'timestamp', 'trailing', 'flush_handle'
+
+    def __init__(self, rule: RateLimitRule, now: float):
+        self.rule = rule
+        self.tokens = rule.burst
+        self.timestamp = now
+        self.trailing = OrderedDict()  # OrderedDict[Tuple[Path, Path], Dict[str, FilesystemEvent]]
+        self.flush_handle = None
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.rule.burst, self.tokens + (now - self.timestamp) * self.rule.rate)
+        self.timestamp = now
+
+
+class RateLimiter:
+    """
+    Limits the rate at which events are delivered, using token buckets.
+
+    Each event is checked against the rules in the order they were added, and the first matching
+    rule decides which token bucket the event draws from. Unless the rule is shared, every path
+    gets its own bucket, so a few busy paths cannot starve the rest.
+
+    Events that arrive while their bucket is empty are suppressed. Suppressed events are folded
+    so that only the latest event of each type for each path is kept, and these are delivered as
+    soon as the bucket has a token again, so the final state of a path is never lost. Delivering
+    the folded events of a path costs one token, so a shared bucket releases them one path at a
+    time, in the order the paths were first suppressed.
+
+    :param deliver: the callable that delivers the events that are let through
+    """
+
+    #: number of buckets to create between sweeps of idle buckets
+    sweep_interval = 1000
+
+    def __init__(self, deliver: Callable[['FilesystemEvent'], None]):
+        self.rules = []  # List[RateLimitRule]
+        self._deliver = deliver
+        self._buckets = {}  # Dict[Any, _TokenBucket]
+        self._created_buckets = 0
+
+    @property
+    def suppressed(self) -> int:
+        """The total number of events suppressed so far."""
+        return sum(rule.suppressed for rule in self.rules)
+
+    def add_rule(self, rate: Real, *, burst: int = 1, pattern: str = None,
+                 shared: bool = False) -> RateLimitRule:
+        """
+        Add a rate limit rule.
+
+        :param rate: the number of events per second to allow, on average
+        :param burst: the number of events allowed to pass in quick succession
+        :param pattern: a glob pattern matched against relative paths (e.g. ``*.log``), or
+            ``None`` to apply this rule to all paths
+        :param shared: ``True`` to have all matching paths share a single token bucket
+        :return: the new rule
+
+        """
+        assert check_argument_types()
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        if burst < 1:
+            raise ValueError('burst must be a positive integer')
+
+        rule = RateLimitRule(pattern, rate, burst, shared)
+        self.rules.append(rule)
+        return rule
+
+    def __call__(self, event: 'FilesystemEvent') -> bool:
+        """
+        Check if the event can be delivered right away.
+
+        :return: ``True`` if the event can be delivered, ``False`` if it was suppressed
+
+        """
+        rule = next((rule for rule in self.rules if rule.matches(event)), None)
+        if rule is None:
+            return True
+
+        loop = get_event_loop()
+        now = loop.time()
+        key = rule if rule.shared else (event.root, event.path)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _TokenBucket(rule, now)
+            self._created_buckets += 1
+            if self._created_buckets % self.sweep_interval == 0:
+                self._sweep(now)
+        else:
+            bucket.refill(now)
+
+        if bucket.tokens >= 1 and not bucket.trailing:
+            bucket.tokens -= 1
+            return True
+
+        # Fold the event into the trailing events and schedule them to be delivered once the
+        # bucket has a token again
+        rule.suppressed += 1
+        path_events = bucket.trailing.get((event.root, event.path))
+        if path_events is None:
+            path_events = bucket.trailing[(event.root, event.path)] = OrderedDict()
+
+        path_events.pop(event.topic, None)
+        path_events[event.topic] = event
+        if bucket.flush_handle is None:
+            self._schedule_flush(bucket, loop)
+
+        return False
+
+    def close(self) -> None:
+        """Cancel the delivery of any pending trailing events."""
+        for bucket in self._buckets.values():
+            if bucket.flush_handle is not None:
+                bucket.flush_handle.cancel()
+
+        self._buckets.clear()
+
+    def _schedule_flush(self, bucket: _TokenBucket, loop) -> None:
+        delay = (1 - bucket.tokens) / bucket.rule.rate
+        bucket.flush_handle = loop.call_later(delay, self._flush, bucket)
+
+    def _flush(self, bucket: _TokenBucket) -> None:
+        # Deliver the folded events of as many paths as there are tokens for (but at least one,
+        # as the flush was scheduled for when the next token is due)
+        loop = get_event_loop()
+        bucket.flush_handle = None
+        bucket.refill(loop.time())
+        events = []
+        while bucket.trailing and (bucket.tokens >= 1 or not events):
+            bucket.tokens = max(bucket.tokens - 1, 0)
+            events.extend(bucket.trailing.popitem(last=False)[1].values())
+
+        if bucket.trailing:
+            self._schedule_flush(bucket, loop)
+
+        for event in events:
+            self._deliver(event)
+
+    def _sweep(self, now: float) -> None:
+        # Buckets that have refilled completely are equivalent to new ones, so drop them
+        for key, bucket in list(self._buckets.items()):
+            if not bucket.trailing:
+                bucket.refill(now)
+                if bucket.tokens >= bucket.rule.burst:
+                    del self._buckets[key]
@@ -0,0 +1,98 @@
+from bisect import bisect_left
+from collections import namedtuple
+from operator import itemgetter
+from os import stat_result
+from typing import Iterable, Tuple, Optional
+
+__all__ = ('Snapshot', 'SnapshotDiff', 'diff_snapshots')
+
+SnapshotDiff = namedtuple('SnapshotDiff', 'created deleted accessed attribute_changed modified')
+SnapshotDiff.__doc__ = """
+The differences between two snapshots.
+
+Each field is a list of paths (in the sorted order of the snapshots).
+"""
+
+
+class Snapshot:
+    """
+    The stat information of a file tree at one point in time.
+
+    The entries are sorted by path once when the snapshot is created, so that two snapshots can
+    be compared with a merge join instead of set operations and repeated sorting.
+
+    :param entries: an iterable of (path, stat result) tuples
+    """
+
+    __slots__ = ('paths', 'rows')
+
+    def __init__(self, entries: Iterable[Tuple[str, stat_result]]):
+        entries = sorted(entries, key=itemgetter(0))
+        self.paths = [path for path, _ in entries]
+        self.rows = [(stat.st_atime_ns, stat.st_mode, stat.st_uid, stat.st_gid,
+                      stat.st_mtime_ns, stat.st_size) for _, stat in entries]
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, path: str):
+        index = bisect_left(self.paths, path)
+        return index < len(self.paths) and self.paths[index] == path
+
+    def get_mode(self, path: str) -> Optional[int]:
+        """Return the ``st_mode`` of the given path, or ``None`` if it's not in the snapshot."""
+        index = bisect_left(self.paths, path)
+        if index < len(self.paths) and self.paths[index] == path:
+            return self.rows[index][1]
+
+        return None
+
+
+def diff_snapshots(old: Snapshot, new: Snapshot) -> SnapshotDiff:
+    """
+    Compare two snapshots of the same file tree.
+
+    If the paths in both snapshots are the same (the usual case), the whole snapshots are first
+    compared in one go, and then row by row, without having to join the paths. The stat fields of
+    a row are only compared individually if the row as a whole differs.
+
+    """
+    diff = SnapshotDiff([], [], [], [], [])
+    if old.paths == new.paths:
+        if old.rows == new.rows:
+            return diff
+
+        common = zip(new.paths, old.rows, new.rows)
+    else:
+        # Merge join the sorted paths of both snapshots
+        common = []
+        old_paths, new_paths = old.paths, new.paths
+        old_length, new_length = len(old_paths), len(new_paths)
+        i = j = 0
+        while i < old_length and j < new_length:
+            old_path, new_path = old_paths[i], new_paths[j]
+            if old_path == new_path:
+                common.append((new_path, old.rows[i], new.rows[j]))
+                i += 1
+                j += 1
+            elif old_path < new_path:
+                diff.deleted.append(old_path)
+                i += 1
+            else:
+                diff.created.append(new_path)
+                j += 1
+
+        diff.deleted.extend(old_paths[i:])
+        diff.created.extend(new_paths[j:])
+
+    # Compare the whole row first, and the individual field groups only if that differs
+    for path, old_row, new_row in common:
+        if old_row != new_row:
+            if old_row[0] != new_row[0]:
+                diff.accessed.append(path)
+            if old_row[1:4] != new_row[1:4]:
+                diff.attribute_changed.append(path)
+            if old_row[4:] != new_row[4:]:
+                diff.modified.append(path)
+
+    return diff
@@ -1,8 +1,13 @@
+import logging
 import os
 import sys
+from errno import EINVAL, ENOENT, ENOTDIR
 from asyncio.events import get_event_loop
+from collections import deque
 from pathlib import Path
-from typing import Union, Iterable
+from typing import Union, Iterable, List, Tuple
+
+from asyncio_extras.threads import call_in_executor
 
 from asphalt.filewatcher.api import FileWatcher, FileEventType
 from asphalt.filewatcher.watchers._inotify import lib, ffi
@@ -13,65 +18,207 @@ _mask_map = {
     FileEventType.attribute: lib.IN_ATTRIB,
     FileEventType.create: lib.IN_CREATE | lib.IN_MOVED_TO,
     FileEventType.delete: lib.IN_DELETE | lib.IN_DELETE_SELF | lib.IN_MOVED_FROM,
-    FileEventType.modify: lib.IN_MODIFY
+    FileEventType.modify: lib.IN_MODIFY,
+    FileEventType.settle: lib.IN_CLOSE_WRITE
 }
+_entry_mask = lib.IN_CREATE | lib.IN_MOVED_TO | lib.IN_DELETE | lib.IN_MOVED_FROM
 _fs_encoding = sys.getfilesystemencoding()
+_vanished_errnos = frozenset([ENOENT, ENOTDIR])
+
+logger = logging.getLogger(__name__)
 
 
 class INotifyFileWatcher(FileWatcher):
-    def __init__(self, path: Union[str, Path], *, events: Iterable[FileEventType],
-                 recursive: bool):
-        super().__init__(path, events, recursive)
+    """
+    A file watcher that uses the Linux inotify API.
+
+    When watching recursively, directories created in (or moved into) the watched tree are
+    watched right away, but their contents are listed in a thread pool, a batch of directories at
+    a time, so that large copy or unpacking operations do not block the event loop. A ``created``
+    event is dispatched for every entry found in those directories, unless one was already
+    dispatched for it since the watch was set up.
+
+    :param path: path to the file or directory to watch, or an iterable of them
+    """
+
+    #: maximum number of new directories to list in a single executor call
+    scan_batch_size = 100
+
+    def __init__(self, path: Union[str, Path, Iterable[Union[str, Path]]], *,
+                 events: Iterable[FileEventType], recursive: bool,
+                 report_existing: bool = False):
+        super().__init__(path, events, recursive, report_existing)
         self._mask = sum(value for event, value in _mask_map.items() if event in self.events)
         if recursive:
             self._mask |= lib.IN_CREATE | lib.IN_DELETE | lib.IN_MOVED_TO | lib.IN_MOVED_FROM
 
         self._watch_file = None
-        self._watches = {}  # Dict[Path, int]
-        self._reverse_watches = {}  # Dict[int, Path]
+        self._watches = {}  # Dict[Tuple[Path, Path], int]
+        self._reverse_watches = {}  # Dict[int, Tuple[Path, Path]]
+        self._scan_queue = deque()  # Deque[Tuple[Path, Path]]
+        self._scanning = {}  # Dict[Tuple[Path, Path], Set[str]]
+        self._scan_task = None
 
     def start(self) -> None:
         fd = lib.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
         if fd < 0:
-            raise OSError(ffi.errno)
+            errno = ffi.errno
+            raise OSError(errno, os.strerror(errno))
 
         # Wrap the file descriptor as a Python file object and start watching for incoming data
         self._watch_file = open(fd, 'rb')
         get_event_loop().add_reader(fd, self._event_available)
 
-        # Add the target file or directory
-        self._add_watch('')
+        # Add the target files or directories
+        for root in self.paths:
+            existing = self._add_watch(root, '', self.report_existing)
+            if self.report_existing:
+                self.scanned.dispatch(existing, root)
 
     def stop(self) -> None:
+        if self._scan_task is not None:
+            self._scan_task.cancel()
+            self._scan_task = None
+
+        self._scan_queue.clear()
+        self._scanning.clear()
         if self._watch_file is not None:
             get_event_loop().remove_reader(self._watch_file.fileno())
             self._watch_file.close()
             self._watch_file = None
 
-    def _add_watch(self, relative_path: Union[str, Path]):
-        path = self.path / relative_path
+    def _add_watch(self, root: Path, relative_path: Union[str, Path],
+                   collect_entries: bool = False) -> List[Path]:
+        """
+        Start watching the given path (and its subdirectories, if watching recursively).
+
+        Every directory is watched before it is listed, so nothing created during the walk can be
+        missed. Access events are masked out until the walk is done, as listing the directories
+        would otherwise trigger them.
+
+        :param root: the root path
+        :param relative_path: the path to watch, relative to ``root``
+        :param collect_entries: ``True`` to return the entries found during the walk
+        :return: the relative paths of the entries found in the walk (if ``collect_entries`` is
+            ``True``)
+
+        """
+        path = root / relative_path
+        walk_mask = self._mask & ~lib.IN_ACCESS
         paths = [path]
-        if self.recursive and path.is_dir():
-            for root, dirnames, _filenames in os.walk(str(path)):
-                paths.extend(Path(root) / dirname for dirname in dirnames)
-
-        for path in paths:
-            pathname = path.path.encode(_fs_encoding)
-            fd = lib.inotify_add_watch(self._watch_file.fileno(), pathname, self._mask)
-            if fd < 0:
-                raise OSError(ffi.errno)
-
-            relative_path = path.relative_to(self.path)
-            self._watches[relative_path] = fd
-            self._reverse_watches[fd] = relative_path
-
-    def _remove_watch(self, relative_path: Path) -> None:
-        for path in list(self._watches):
-            if relative_path == path or relative_path in path.parents:
-                fd = self._watches.pop(path)
+        self._arm_watch(root, path, walk_mask)
+        entries = []
+        if path.is_dir() and (self.recursive or collect_entries):
+            for dirpath, dirnames, filenames in os.walk(str(path)):
+                dirpath = Path(dirpath)
+                if collect_entries:
+                    entries.extend(dirpath.joinpath(name).relative_to(root)
+                                   for name in dirnames + filenames)
+
+                if self.recursive:
+                    for dirname in dirnames:
+                        paths.append(dirpath / dirname)
+                        self._arm_watch(root, paths[-1], walk_mask)
+                else:
+                    del dirnames[:]
+
+        if walk_mask != self._mask:
+            for path in paths:
+                self._arm_watch(root, path, self._mask)
+
+        return entries
+
+    def _watch_new_directory(self, root: Path, relative_path: Path) -> None:
+        # Arm the watch right away and leave the listing to _scan_new_directories()
+        key = root, relative_path
+        if key in self._scanning:
+            return
+
+        try:
+            self._arm_watch(root, root / relative_path, self._mask & ~lib.IN_ACCESS)
+        except OSError as exc:
+            if exc.errno not in _vanished_errnos:
+                logger.error('Could not watch new directory %s: %s', root / relative_path,
+                             exc.strerror)
+
+            return  # the directory is already gone or can't be watched
+
+        self._scanning[key] = set()
+        self._scan_queue.append(key)
+        if self._scan_task is None:
+            self._scan_task = get_event_loop().create_task(self._scan_new_directories())
+
+    async def _scan_new_directories(self) -> None:
+        try:
+            while self._scan_queue:
+                batch = [self._scan_queue.popleft() for _ in
+                         range(min(len(self._scan_queue), self.scan_batch_size))]
+                listings = await call_in_executor(self._list_directories, batch)
+                for key, entries in zip(batch, listings):
+                    # Entries that events have already been received for are skipped
+                    seen = self._scanning.pop(key, None)
+                    if seen is None:
+                        continue  # the directory was deleted in the meantime
+
+                    root, relative_path = key
+                    for name, is_dir in entries:
+                        if name not in seen:
+                            path = relative_path / name
+                            if is_dir and self.recursive:
+                                self._watch_new_directory(root, path)
+
+                            if FileEventType.create in self.events:
+                                self._dispatch(FileEventType.create, path, root)
+
+                    if self._mask & lib.IN_ACCESS:
+                        try:
+                            self._arm_watch(root, root / relative_path, self._mask)
+                        except OSError as exc:
+                            if exc.errno not in _vanished_errnos:
+                                logger.error('Could not watch new directory %s: %s',
+                                             root / relative_path, exc.strerror)
+        finally:
+            self._scan_task = None
+
+    @staticmethod
+    def _list_directories(directories: List[Tuple[Path, Path]]) -> List[List[Tuple[str, bool]]]:
+        listings = []
+        for root, relative_path in directories:
+            try:
+                listings.append([(entry.name, entry.is_dir(follow_symlinks=False))
+                                 for entry in os.scandir(str(root / relative_path))])
+            except OSError as exc:
+                if exc.errno not in _vanished_errnos:
+                    logger.error('Could not list new directory %s: %s', root / relative_path,
+                                 exc.strerror)
+
+                listings.append([])
+
+        return listings
+
+    def _arm_watch(self, root: Path, path: Path, mask: int) -> None:
+        pathname = str(path).encode(_fs_encoding)
+        fd = lib.inotify_add_watch(self._watch_file.fileno(), pathname, mask)
+        if fd < 0:
+            errno = ffi.errno
+            raise OSError(errno, os.strerror(errno), str(path))
+
+        key = root, path.relative_to(root)
+        self._watches[key] = fd
+        self._reverse_watches[fd] = key
+
+    def _remove_watch(self, root: Path, relative_path: Path) -> None:
+        for key in list(self._watches):
+            path_root, path = key
+            if path_root == root and (relative_path == path or relative_path in path.parents):
+                fd = self._watches.pop(key)
                 del self._reverse_watches[fd]
+                self._scanning.pop(key, None)
                 if lib.inotify_rm_watch(self._watch_file.fileno(), fd) < 0:
-                    raise OSError(ffi.errno)
+                    # EINVAL means the kernel already dropped the watch along with the directory
+                    errno = ffi.errno
+                    if errno != EINVAL:
+                        raise OSError(errno, os.strerror(errno), str(path_root / path))
 
     def _event_available(self):
         event = ffi.new('struct inotify_event *')
@@ -79,36 +226,51 @@ class INotifyFileWatcher(FileWatcher):
         data = self._watch_file.read(STRUCT_SIZE)
         while data:
             event_buffer[:] = data
-            relative_path = self._reverse_watches[event.wd]
-            if event.len:
-                raw_path = self._watch_file.read(event.len)
-                filename = raw_path.rstrip(b'\x00').decode(_fs_encoding, errors='surrogatepass')
-                relative_path /= filename
+            raw_path = self._watch_file.read(event.len) if event.len else b''
+            if event.mask & lib.IN_Q_OVERFLOW:
+                logger.warning('The inotify event queue overflowed; some events were lost')
+            elif event.wd in self._reverse_watches and not event.mask & lib.IN_IGNORED:
+                # Records for watches that have already been removed are skipped
+                self._handle_event(event.wd, event.mask, raw_path)
 
-            fullpath = self.path / relative_path
-            if event.mask & lib.IN_ACCESS and FileEventType.access in self.events:
-                self.accessed.dispatch(relative_path)
+            data = self._watch_file.read(STRUCT_SIZE)
 
-            if event.mask & lib.IN_ATTRIB and FileEventType.attribute in self.events:
-                self.attribute_changed.dispatch(relative_path)
+    def _handle_event(self, wd: int, mask: int, raw_path: bytes) -> None:
+        root, relative_path = self._reverse_watches[wd]
+        if raw_path:
+            filename = raw_path.rstrip(b'\x00').decode(_fs_encoding, errors='surrogatepass')
 
-            if event.mask & (lib.IN_CREATE | lib.IN_MOVED_TO):
-                if self.recursive and fullpath.is_dir():
-                    # Start watching this subdirectory
-                    self._add_watch(relative_path)
+            # Keep the pending scan of the directory from reporting this entry again
+            seen = self._scanning.get((root, relative_path))
+            if seen is not None and mask & _entry_mask:
+                seen.add(filename)
 
-                if FileEventType.create in self.events:
-                    self.created.dispatch(relative_path)
+            relative_path /= filename
 
-            if event.mask & (lib.IN_DELETE | lib.IN_DELETE_SELF | lib.IN_MOVED_FROM):
-                if self.recursive and relative_path in self._watches:
-                    # Remove watches matching this directory and its subdirectories
-                    self._remove_watch(relative_path)
+        if mask & lib.IN_ACCESS and FileEventType.access in self.events:
+            self._dispatch(FileEventType.access, relative_path, root)
 
-                if FileEventType.delete in self.events:
-                    self.deleted.dispatch(relative_path)
+        if mask & lib.IN_ATTRIB and FileEventType.attribute in self.events:
+            self._dispatch(FileEventType.attribute, relative_path, root)
 
-            if event.mask & lib.IN_MODIFY and FileEventType.modify in self.events:
-                self.modified.dispatch(relative_path)
+        if mask & (lib.IN_CREATE | lib.IN_MOVED_TO):
+            if self.recursive and mask & lib.IN_ISDIR:
+                # Start watching this subdirectory
+                self._watch_new_directory(root, relative_path)
 
-            data = self._watch_file.read(STRUCT_SIZE)
+            if FileEventType.create in self.events:
+                self._dispatch(FileEventType.create, relative_path, root)
+
+        if mask & (lib.IN_DELETE | lib.IN_DELETE_SELF | lib.IN_MOVED_FROM):
+            if self.recursive and (root, relative_path) in self._watches:
+                # Remove watches matching this directory and its subdirectories
+                self._remove_watch(root, relative_path)
+
+            if FileEventType.delete in self.events:
+                self._dispatch(FileEventType.delete, relative_path, root)
+
+        if mask & lib.IN_MODIFY and FileEventType.modify in self.events:
+            self._dispatch(FileEventType.modify, relative_path, root)
+
+        if mask & lib.IN_CLOSE_WRITE and FileEventType.settle in self.events:
+            self._dispatch(FileEventType.settle, relative_path, root)
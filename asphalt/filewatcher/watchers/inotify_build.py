@@ -16,12 +16,16 @@ ffi.cdef("""
 
     #define IN_ACCESS ...
     #define IN_ATTRIB ...
+    #define IN_CLOSE_WRITE ...
     #define IN_CREATE ...
     #define IN_DELETE ...
     #define IN_DELETE_SELF ...
+    #define IN_IGNORED ...
+    #define IN_ISDIR ...
     #define IN_MODIFY ...
     #define IN_MOVED_FROM ...
     #define IN_MOVED_TO ...
+    #define IN_Q_OVERFLOW ...
 """)
 
 if __name__ == '__main__':
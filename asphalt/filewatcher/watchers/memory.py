@@ -0,0 +1,187 @@
+from asyncio import get_event_loop, sleep
+from numbers import Real
+from pathlib import Path
+from typing import Union, Iterable, Sequence, Dict, Optional
+
+from typeguard import check_argument_types
+
+from asphalt.filewatcher.api import FileWatcher, FileEventType
+
+
+class MemoryFileWatcher(FileWatcher):
+    """
+    A simulated file watcher that works on an in-process fake file tree instead of the file system.
+
+    This backend is meant for testing and load testing event handlers: the events go through the
+    same dispatch path (rate limiting, journals, publishers, subscriptions) as with the real
+    backends, but producing them costs nothing besides the dispatching itself.
+
+    Events can be produced either by manipulating the fake tree (:meth:`create`, :meth:`modify`,
+    :meth:`delete` etc.) or by replaying a recorded trace of events (:meth:`replay`, or the
+    ``trace`` option which starts replaying it when the watcher is started).
+
+    A trace is a sequence of ``(timestamp, event type, path)`` or
+    ``(timestamp, event type, path, root)`` tuples, where the event type is either a
+    :class:`~asphalt.filewatcher.api.FileEventType` or its name, and the path is relative to the
+    root (which defaults to the first root path). Trace events are dispatched as is, without
+    consulting the fake tree. Events of types not being watched and events for unknown roots are
+    skipped, as are events from subdirectories when not watching recursively.
+
+    The watched paths do not need to exist.
+
+    :param path: path (or an iterable of paths) of the fake root directories
+    :param tree: relative paths of the files initially present in the first root directory (their
+        parent directories are created automatically; a trailing slash denotes a directory)
+    :param trace: a trace of events to replay when the watcher is started
+    :param speed: playback speed of the trace (1 = the recorded rate, 2 = double that etc.), or
+        ``None`` to replay it as fast as possible
+    """
+
+    def __init__(self, path: Union[str, Path, Iterable[Union[str, Path]]], *,
+                 events: Iterable[FileEventType] = FileEventType.all, recursive: bool = True,
+                 report_existing: bool = False, tree: Iterable[str] = (),
+                 trace: Iterable[Sequence] = None, speed: Optional[Real] = 1):
+        assert check_argument_types()
+        super().__init__(path, events, recursive, report_existing)
+        if speed is not None and speed <= 0:
+            raise ValueError('speed must be positive or None')
+
+        self.recursive = recursive  # the roots are not real directories
+        self.trace = trace
+        self.speed = speed
+        self._trees = {root: {Path(): True} for root in self.paths}  # Dict[Path, Dict[Path, bool]]
+        self._replay_task = None
+        for entry in tree:
+            self._add_entry(self.path, Path(entry), entry.endswith('/'))
+
+    def start(self) -> None:
+        if self.report_existing:
+            for root, tree in self._trees.items():
+                self.scanned.dispatch(sorted(path for path in tree if path != Path()), root)
+
+        if self.trace is not None:
+            self._replay_task = get_event_loop().create_task(self.replay(self.trace, self.speed))
+
+    def stop(self) -> None:
+        if self._replay_task:
+            self._replay_task.cancel()
+            self._replay_task = None
+
+    def exists(self, path: Union[str, Path], root: Union[str, Path] = None) -> bool:
+        """Return ``True`` if the given path exists in the fake tree."""
+        return Path(path) in self._get_tree(root)
+
+    def create(self, path: Union[str, Path], *, directory: bool = False,
+               root: Union[str, Path] = None) -> None:
+        """
+        Create a file or directory in the fake tree.
+
+        :param path: path of the new entry, relative to the root
+        :param directory: ``True`` to create a directory instead of a file
+        :param root: the root path (defaults to the first root path)
+        :raises FileExistsError: if the path already exists
+        :raises FileNotFoundError: if the parent directory does not exist
+
+        """
+        path, tree = Path(path), self._get_tree(root)
+        if path in tree:
+            raise FileExistsError(str(path))
+        if not tree.get(path.parent):
+            raise FileNotFoundError(str(path.parent))
+
+        tree[path] = directory
+        self._emit(FileEventType.create, path, root)
+
+    def modify(self, path: Union[str, Path], root: Union[str, Path] = None) -> None:
+        """Simulate a write to a file in the fake tree."""
+        self._emit(FileEventType.modify, self._check_exists(path, root), root)
+
+    def access(self, path: Union[str, Path], root: Union[str, Path] = None) -> None:
+        """Simulate a read from a file in the fake tree."""
+        self._emit(FileEventType.access, self._check_exists(path, root), root)
+
+    def change_attributes(self, path: Union[str, Path], root: Union[str, Path] = None) -> None:
+        """Simulate a change in the permissions or ownership of an entry in the fake tree."""
+        self._emit(FileEventType.attribute, self._check_exists(path, root), root)
+
+    def settle(self, path: Union[str, Path], root: Union[str, Path] = None) -> None:
+        """Simulate a writer closing a file in the fake tree."""
+        self._emit(FileEventType.settle, self._check_exists(path, root), root)
+
+    def delete(self, path: Union[str, Path], root: Union[str, Path] = None) -> None:
+        """
+        Delete a file or directory from the fake tree.
+
+        The contents of a directory are deleted first (deepest entries first), each producing its
+        own event.
+
+        """
+        path, tree = self._check_exists(path, root), self._get_tree(root)
+        if path == Path():
+            raise ValueError('cannot delete the root directory')
+
+        contents = [entry for entry in tree if path in entry.parents]
+        for entry in sorted(contents, key=lambda entry: len(entry.parts), reverse=True) + [path]:
+            del tree[entry]
+            self._emit(FileEventType.delete, entry, root)
+
+    async def replay(self, trace: Iterable[Sequence], speed: Optional[Real] = 1) -> None:
+        """
+        Dispatch the events from a recorded trace.
+
+        When replaying as fast as possible, control is still yielded to the event loop after
+        each event so that the listeners get to run.
+
+        :param trace: an iterable of ``(timestamp, event type, path[, root])`` tuples
+        :param speed: playback speed (1 = the recorded rate), or ``None`` for as fast as possible
+
+        """
+        assert check_argument_types()
+        loop = get_event_loop()
+        start_time = first_timestamp = None
+        for timestamp, event_type, path, *root in trace:
+            if speed is not None:
+                if start_time is None:
+                    start_time, first_timestamp = loop.time(), timestamp
+                else:
+                    delay = start_time + (timestamp - first_timestamp) / speed - loop.time()
+                    if delay > 0:
+                        await sleep(delay)
+
+            if isinstance(event_type, str):
+                event_type = FileEventType[event_type]
+
+            path = Path(path)
+            root = Path(root[0]) if root else self.path
+            accepted = self.recursive or len(path.parts) <= 1
+            if accepted and event_type in self.events and root in self._trees:
+                self._dispatch(event_type, path, root)
+
+            if speed is None:
+                await sleep(0)
+
+    def _get_tree(self, root: Optional[Union[str, Path]]) -> Dict[Path, bool]:
+        root = Path(root) if root is not None else self.path
+        try:
+            return self._trees[root]
+        except KeyError:
+            raise ValueError('{} is not a watched root path'.format(root)) from None
+
+    def _check_exists(self, path: Union[str, Path], root: Optional[Union[str, Path]]) -> Path:
+        path = Path(path)
+        if path not in self._get_tree(root):
+            raise FileNotFoundError(str(path))
+
+        return path
+
+    def _add_entry(self, root: Path, path: Path, directory: bool) -> None:
+        tree = self._trees[root]
+        for parent in path.parents:
+            tree[parent] = True
+
+        tree[path] = directory
+
+    def _emit(self, event_type: FileEventType, path: Path,
+              root: Optional[Union[str, Path]]) -> None:
+        if event_type in self.events and (self.recursive or len(path.parts) <= 1):
+            self._dispatch(event_type, path, Path(root) if root is not None else self.path)
@@ -1,84 +1,130 @@
 import os
 from asyncio import get_event_loop, sleep
+from itertools import chain
 from numbers import Real
 from os import stat_result
 from pathlib import Path
-from typing import Union, Dict, Iterable
+from stat import S_ISREG
+from typing import Union, Dict, Iterable, Set, Tuple, List, Iterator
 
 from asyncio_extras.threads import call_in_executor
 from typeguard import check_argument_types
 
 from asphalt.filewatcher.api import FileWatcher, FileEventType
+from asphalt.filewatcher.snapshot import Snapshot, diff_snapshots
 
 
 class PollingFileWatcher(FileWatcher):
-    def __init__(self, path: Union[str, Path], interval: Real, *,
-                 events: Iterable[FileEventType] = FileEventType.all, recursive: bool = True):
+    """
+    A file watcher that periodically takes a snapshot of the file tree and compares it to the
+    previous one.
+
+    All root paths are scanned in the same executor call on every poll. Each snapshot is sorted
+    once and compared to the previous one with
+    :func:`~asphalt.filewatcher.snapshot.diff_snapshots`.
+
+    Since there is no way to tell when a writer closes a file, a file is considered settled once
+    its size and modification time have stayed the same for ``settle_ticks`` consecutive polls.
+
+    :param path: path to the file or directory to watch, or an iterable of them
+    :param interval: number of seconds to wait between polls
+    :param settle_ticks: number of consecutive polls a created or modified file must stay
+        unchanged for before a ``settled`` event is dispatched for it
+    """
+
+    _event_attributes = ((FileEventType.create, 'created'), (FileEventType.delete, 'deleted'),
+                         (FileEventType.access, 'accessed'),
+                         (FileEventType.attribute, 'attribute_changed'),
+                         (FileEventType.modify, 'modified'))
+
+    def __init__(self, path: Union[str, Path, Iterable[Union[str, Path]]], interval: Real, *,
+                 events: Iterable[FileEventType] = FileEventType.all, recursive: bool = True,
+                 report_existing: bool = False, settle_ticks: int = 2):
         assert check_argument_types()
-        super().__init__(path, events, recursive)
+        super().__init__(path, events, recursive, report_existing)
+        if settle_ticks < 1:
+            raise ValueError('settle_ticks must be a positive integer')
+
         self.interval = interval
+        self.settle_ticks = settle_ticks
         self._poll_task = None
-        self._old_stats = self._old_files = None
+        self._old_snapshots = None
+        self._unsettled = {}  # Dict[Tuple[Path, str], int]
 
     def start(self) -> None:
-        self._old_stats = self._collect_stats()
-        self._old_files = frozenset(self._old_stats)
+        self._old_snapshots = self._take_snapshots()
         self._poll_task = get_event_loop().create_task(self._poll_files())
+        if self.report_existing:
+            # The snapshot doubles as the baseline for the first poll, so anything changed after
+            # it was taken will be reported as a regular event
+            for root, snapshot in zip(self.paths, self._old_snapshots):
+                self.scanned.dispatch([Path(path) for path in snapshot.paths if path != '.'],
+                                      root)
 
     def stop(self) -> None:
         if self._poll_task:
             self._poll_task.cancel()
             self._poll_task = None
 
-    def _collect_stats(self) -> Dict[Path, stat_result]:
-        paths = [self.path]
-        if self.path.is_dir():
+    def _take_snapshots(self) -> List[Snapshot]:
+        return [Snapshot(self._collect_stats(root)) for root in self.paths]
+
+    def _collect_stats(self, root: Path) -> Iterator[Tuple[str, stat_result]]:
+        # Stat everything only after the walk, so that the access times of the directories
+        # reflect them having been listed
+        root_str = str(root)
+        paths = ['.']
+        if root.is_dir():
             if self.recursive:
-                for root, dirnames, filenames in os.walk(str(self.path)):
-                    paths.extend(Path(root).joinpath(name).relative_to(self.path) for
-                                 name in dirnames + filenames)
+                prefix_length = len(os.path.join(root_str, ''))
+                for dirpath, dirnames, filenames in os.walk(root_str):
+                    relative_dir = dirpath[prefix_length:]
+                    paths.extend(os.path.join(relative_dir, name)
+                                 for name in dirnames + filenames)
             else:
-                paths.extend(self.path.iterdir())
+                paths.extend(os.listdir(root_str))
 
-        return {path: self.path.joinpath(path).stat() for path in paths}
+        for path in paths:
+            try:
+                # The root itself is stat'ed as is, as it may also be a file
+                yield path, os.stat(root_str if path == '.' else os.path.join(root_str, path))
+            except FileNotFoundError:
+                if path == '.':
+                    raise
 
     async def _poll_files(self):
         while True:
             await sleep(self.interval)
-            new_stats = await call_in_executor(self._collect_stats)
-            new_files = frozenset(new_stats)
-
-            # Check for any new files
-            if FileEventType.create in self.events:
-                for path in sorted(new_files - self._old_files):
-                    self.created.dispatch(path)
-
-            # Check for deleted files
-            if FileEventType.delete in self.events:
-                for path in sorted(self._old_files - new_files):
-                    self.deleted.dispatch(path)
-
-            # Check for modified files
-            if {FileEventType.modify, FileEventType.attribute, FileEventType.access} & self.events:
-                for path in sorted(self._old_files & new_files):
-                    old = self._old_stats[path]
-                    new = new_stats[path]
-
-                    # Check for differences in access time
-                    if FileEventType.access in self.events:
-                        if old.st_atime_ns != new.st_atime_ns:
-                            self.accessed.dispatch(path)
-
-                    # Check for differences in mode, owner and group
-                    if FileEventType.attribute in self.events:
-                        if (old.st_mode != new.st_mode or old.st_uid != new.st_uid or
-                                old.st_gid != new.st_gid):
-                            self.attribute_changed.dispatch(path)
-
-                    # Check for differences in modification time and size
-                    if FileEventType.modify in self.events:
-                        if old.st_mtime_ns != new.st_mtime_ns or old.st_size != new.st_size:
-                            self.modified.dispatch(path)
-
-            self._old_stats = new_stats
-            self._old_files = new_files
+            new_snapshots = await call_in_executor(self._take_snapshots)
+            diffs = [(root, diff_snapshots(old, new)) for root, old, new in
+                     zip(self.paths, self._old_snapshots, new_snapshots)]
+            for event_type, attribute in self._event_attributes:
+                if event_type in self.events:
+                    for root, diff in diffs:
+                        for path in getattr(diff, attribute):
+                            self._dispatch(event_type, Path(path), root)
+
+            # Check for files that have stopped changing
+            if FileEventType.settle in self.events:
+                changed_files = {(root, path) for root, diff in diffs
+                                 for path in chain(diff.created, diff.modified)}
+                self._check_settled(dict(zip(self.paths, new_snapshots)), changed_files)
+
+            self._old_snapshots = new_snapshots
+
+    def _check_settled(self, snapshots: Dict[Path, Snapshot],
+                       changed_files: Set[Tuple[Path, str]]):
+        for key in sorted(self._unsettled):
+            root, path = key
+            if path not in snapshots[root]:
+                del self._unsettled[key]
+            elif key not in changed_files:
+                self._unsettled[key] += 1
+                if self._unsettled[key] >= self.settle_ticks:
+                    del self._unsettled[key]
+                    self._dispatch(FileEventType.settle, Path(path), root)
+
+        # Start (or restart) the countdown for any files written to since the last poll
+        for root, path in changed_files:
+            if S_ISREG(snapshots[root].get_mode(path)):
+                self._unsettled[(root, path)] = 0
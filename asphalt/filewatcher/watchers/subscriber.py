@@ -0,0 +1,106 @@
+import logging
+import struct
+from asyncio import get_event_loop, open_unix_connection, sleep, IncompleteReadError
+from numbers import Real
+from pathlib import Path
+from typing import Union, Iterable, List
+
+from typeguard import check_argument_types
+
+from asphalt.filewatcher.api import FileWatcher, FileEventType
+from asphalt.filewatcher.journal import _decode_records, _make_event
+from asphalt.filewatcher.publisher import _frame_header, FRAME_ROOTS, FRAME_EVENTS
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriberFileWatcher(FileWatcher):
+    """
+    Receives events from an :class:`~asphalt.filewatcher.publisher.EventPublisher` in another
+    process, instead of watching the file system directly.
+
+    The watched paths should match (some of) the root paths of the publishing watcher. Events
+    from other roots, events of types not being watched and (if not watching recursively) events
+    from subdirectories are ignored. If the connection is lost, the watcher keeps trying to
+    reconnect; any events published in the meantime are lost. A frame that cannot be decoded (for
+    example, one with an unknown event type or root) is logged and the connection is reopened.
+
+    :param path: path to the file or directory to watch, or an iterable of them
+    :param report_existing: not supported by this backend (must be ``False``), as the existing
+        files are only known to the publishing process
+    :param socket_path: path to the UNIX domain socket the publisher is listening on
+    :param reconnect_delay: number of seconds to wait between connection attempts
+    """
+
+    def __init__(self, path: Union[str, Path, Iterable[Union[str, Path]]], *,
+                 events: Iterable[FileEventType], recursive: bool,
+                 report_existing: bool = False, socket_path: Union[str, Path],
+                 reconnect_delay: Real = 1):
+        assert check_argument_types()
+        if report_existing:
+            raise ValueError('the subscriber backend does not support report_existing')
+
+        super().__init__(path, events, recursive)
+        self.socket_path = Path(socket_path)
+        self.reconnect_delay = reconnect_delay
+        self._read_task = None
+
+    def start(self) -> None:
+        self._read_task = get_event_loop().create_task(self._read_events())
+
+    def stop(self) -> None:
+        if self._read_task:
+            self._read_task.cancel()
+            self._read_task = None
+
+    def _handle_record(self, fields: tuple, roots: List[Path]) -> None:
+        _, event_type, root_index, path, summary = fields
+        root = roots[root_index]
+        if root not in self.paths:
+            return
+
+        if summary is None:
+            if event_type in self.events and (self.recursive or len(path.parts) <= 1):
+                self._dispatch(event_type, path, root)
+        elif self.recursive or not path.parts:
+            # Directory summaries bypass this watcher's own aggregation and rate limiting
+            event = _make_event(self, fields, root)
+            event.counts = {event_type: count for event_type, count in event.counts.items()
+                            if event_type in self.events}
+            if event.counts:
+                self._deliver(event)
+
+    async def _read_events(self):
+        while True:
+            try:
+                reader, writer = await open_unix_connection(str(self.socket_path))
+            except OSError as exc:
+                logger.debug('Could not connect to %s: %s', self.socket_path, exc)
+                await sleep(self.reconnect_delay)
+                continue
+
+            try:
+                roots = []
+                while True:
+                    header = await reader.readexactly(_frame_header.size)
+                    length, frame_type = _frame_header.unpack(header)
+                    payload = await reader.readexactly(length)
+                    if frame_type == FRAME_ROOTS:
+                        roots = [Path(root.decode('utf-8', errors='surrogateescape'))
+                                 for root in payload.split(b'\x00')]
+                    elif frame_type == FRAME_EVENTS:
+                        offset = 0
+                        for offset, _, fields in _decode_records(payload):
+                            self._handle_record(fields, roots)
+
+                        if offset != length:
+                            raise ValueError('truncated event record')
+            except (IncompleteReadError, ConnectionError):
+                logger.warning('Lost connection to the event publisher at %s', self.socket_path)
+            except (struct.error, ValueError, IndexError) as exc:
+                logger.error('Received a malformed frame from the event publisher at %s (%s); '
+                             'reconnecting', self.socket_path, exc)
+            finally:
+                writer.close()
+
+            await sleep(self.reconnect_delay)
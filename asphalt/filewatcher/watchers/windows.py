@@ -1,8 +1,9 @@
 import logging
+import os
 import sys
 from asyncio import get_event_loop, CancelledError
 from pathlib import Path
-from typing import Union, Iterable
+from typing import Union, Iterable, List
 
 from asyncio_extras.threads import call_in_executor
 
@@ -27,44 +28,62 @@ NOTIFY_STRUCT_SIZE = ffi.sizeof('FILE_NOTIFY_INFORMATION')
 
 
 class WindowsFileWatcher(FileWatcher):
-    def __init__(self, path: Union[str, Path], *, events: Iterable[FileEventType],
-                 recursive: bool):
-        super().__init__(path, events, recursive)
-        self._poll_task = None
-        self._overlapped_buffer = ffi.new('LPOVERLAPPED')
+    def __init__(self, path: Union[str, Path, Iterable[Union[str, Path]]], *,
+                 events: Iterable[FileEventType], recursive: bool,
+                 report_existing: bool = False):
+        super().__init__(path, events, recursive, report_existing)
+        self._poll_tasks = []
         self._mask = 0
         for event, value in _mask_map.items():
             if event in self.events:
                 self._mask |= _mask_map.get(event, 0)
 
     def start(self) -> None:
-        handle = lib.CreateFile(
-            str(self.path),
-            lib.FILE_LIST_DIRECTORY,
-            lib.FILE_SHARE_READ | lib.FILE_SHARE_WRITE | lib.FILE_SHARE_DELETE,
-            ffi.NULL,
-            lib.OPEN_EXISTING,
-            lib.FILE_FLAG_BACKUP_SEMANTICS | lib.FILE_FLAG_OVERLAPPED,
-            ffi.NULL
-        )
-        if not handle:
-            code, message = ffi.getwinerror()
-            raise OSError(ffi.errno, message, str(self.path), code)
-
-        self._poll_task = get_event_loop().create_task(self._read_events(handle))
+        # Each root needs its own directory handle, so read them all in separate tasks
+        for root in self.paths:
+            handle = lib.CreateFile(
+                str(root),
+                lib.FILE_LIST_DIRECTORY,
+                lib.FILE_SHARE_READ | lib.FILE_SHARE_WRITE | lib.FILE_SHARE_DELETE,
+                ffi.NULL,
+                lib.OPEN_EXISTING,
+                lib.FILE_FLAG_BACKUP_SEMANTICS | lib.FILE_FLAG_OVERLAPPED,
+                ffi.NULL
+            )
+            if not handle:
+                code, message = ffi.getwinerror()
+                self.stop()
+                raise OSError(ffi.errno, message, str(root), code)
+
+            task = get_event_loop().create_task(self._read_events(root, handle))
+            self._poll_tasks.append(task)
 
     def stop(self) -> None:
-        if self._poll_task:
-            self._poll_task.cancel()
-            self._poll_task = None
+        for task in self._poll_tasks:
+            task.cancel()
+
+        del self._poll_tasks[:]
+
+    def _scan_existing(self, root: Path) -> List[Path]:
+        if not self.recursive:
+            return [Path(name) for name in os.listdir(str(root))]
 
-    async def _read_events(self, dir_handle):
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(str(root)):
+            paths.extend(Path(dirpath).joinpath(name).relative_to(root)
+                         for name in dirnames + filenames)
+
+        return paths
+
+    async def _read_events(self, root: Path, dir_handle):
         notify_info_buffer = ffi.new('char[16384]')
         num_readbytes_buf = ffi.new('LPDWORD')
+        overlapped_buffer = ffi.new('LPOVERLAPPED')
+        scan_pending = self.report_existing
         while True:
             retval = lib.ReadDirectoryChangesW(
                 dir_handle, notify_info_buffer, len(notify_info_buffer),
-                self.recursive, self._mask, num_readbytes_buf, self._overlapped_buffer,
+                self.recursive, self._mask, num_readbytes_buf, overlapped_buffer,
                 ffi.NULL)
             if not retval:
                 code, message = ffi.getwinerror()
@@ -72,12 +91,18 @@ class WindowsFileWatcher(FileWatcher):
                     logging.error('error calling ReadDirectoryChangesW(): %d (%s)', code, message)
                 break
 
+            if scan_pending:
+                # Changes are buffered from this point on, so it's safe to scan the tree now
+                scan_pending = False
+                existing = await call_in_executor(self._scan_existing, root)
+                self.scanned.dispatch(existing, root)
+
             try:
                 retval = await call_in_executor(
-                    lib.GetOverlappedResult, dir_handle, self._overlapped_buffer,
+                    lib.GetOverlappedResult, dir_handle, overlapped_buffer,
                     num_readbytes_buf, True)
             except CancelledError:
-                lib.CancelIoEx(dir_handle, self._overlapped_buffer)
+                lib.CancelIoEx(dir_handle, overlapped_buffer)
                 break
 
             if not retval:
@@ -97,12 +122,12 @@ class WindowsFileWatcher(FileWatcher):
                     path = Path(pathname)
                     if notify_info.Action in (
                             lib.FILE_ACTION_ADDED, lib.FILE_ACTION_RENAMED_NEW_NAME):
-                        self.created.dispatch(path)
+                        self._dispatch(FileEventType.create, path, root)
                     elif notify_info.Action in (
                             lib.FILE_ACTION_REMOVED, lib.FILE_ACTION_RENAMED_OLD_NAME):
-                        self.deleted.dispatch(path)
+                        self._dispatch(FileEventType.delete, path, root)
                     elif notify_info.Action == lib.FILE_ACTION_MODIFIED:
-                        self.modified.dispatch(path)
+                        self._dispatch(FileEventType.modify, path, root)
 
                 if notify_info.NextEntryOffset:
                     offset = notify_info.NextEntryOffset
@@ -0,0 +1,181 @@
+"""
+Measures the CPU time of a polling watcher tick.
+
+The first part compares synthetic snapshots (no file system access is involved), so only the
+cost of the diff itself is measured. Between the snapshots, 0.1% of the files are created,
+deleted, modified, accessed and chmodded (in equal shares). The legacy set based algorithm is
+run with both string and ``Path`` keys: the difference between the two is the cost of the
+``Path`` keys alone, and the difference between the string keyed legacy run and the merge join
+is the gain from the merge join alone.
+
+The second part measures full ticks (stat collection plus diff) over a real file tree created in
+a temporary directory, where 0.1% of the files are modified between the ticks. The legacy tick
+is the stat collection (with ``Path`` keys) and diff of the original polling watcher; the new
+tick is ``PollingFileWatcher._take_snapshots()`` followed by ``diff_snapshots()``.
+
+Usage: python benchmarks/poll_diff.py [--tree-files N ...] [number of files ...]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from asphalt.filewatcher.snapshot import Snapshot, diff_snapshots
+from asphalt.filewatcher.watchers.poll import PollingFileWatcher
+
+
+def make_stat(size=100, atime=1, mtime=1, mode=0o100644):
+    return os.stat_result((mode, 0, 0, 1, 1000, 1000, size, 0, 0, 0, None, None, None, atime,
+                           mtime, 0))
+
+
+def make_entries(count):
+    entries = []
+    for i in range(count):
+        path = os.path.join('dir{}'.format(i // 10000), 'sub{}'.format(i // 100 % 100),
+                            'file{}.dat'.format(i))
+        entries.append((path, make_stat()))
+
+    random.shuffle(entries)  # os.walk() order is arbitrary
+    return entries
+
+
+def mutate(entries, fraction=0.001):
+    entries = list(entries)
+    changes = max(int(len(entries) * fraction / 5), 1)
+    indexes = random.sample(range(len(entries)), changes * 4)
+    for i in indexes[:changes]:
+        entries[i] = (entries[i][0], make_stat(size=200, mtime=2))
+    for i in indexes[changes:changes * 2]:
+        entries[i] = (entries[i][0], make_stat(atime=2))
+    for i in indexes[changes * 2:changes * 3]:
+        entries[i] = (entries[i][0], make_stat(mode=0o100600))
+    for i in sorted(indexes[changes * 3:], reverse=True):
+        del entries[i]
+
+    entries.extend(('new{}.dat'.format(i), make_stat()) for i in range(changes))
+    return entries
+
+
+def legacy_diff(old_stats, new_stats):
+    """The set based algorithm previously used by PollingFileWatcher._poll_files()."""
+    old_files, new_files = frozenset(old_stats), frozenset(new_stats)
+    events = []
+    for path in sorted(new_files - old_files):
+        events.append(('created', path))
+    for path in sorted(old_files - new_files):
+        events.append(('deleted', path))
+    for key in sorted(old_files & new_files):
+        old, new = old_stats[key], new_stats[key]
+        if old.st_atime_ns != new.st_atime_ns:
+            events.append(('accessed', key))
+        if old.st_mode != new.st_mode or old.st_uid != new.st_uid or old.st_gid != new.st_gid:
+            events.append(('attribute_changed', key))
+        if old.st_mtime_ns != new.st_mtime_ns or old.st_size != new.st_size:
+            events.append(('modified', key))
+
+    return events
+
+
+def legacy_collect_stats(root):
+    """The stat collection previously used by PollingFileWatcher._collect_stats()."""
+    paths = [root]
+    for dirpath, dirnames, filenames in os.walk(str(root)):
+        paths.extend(Path(dirpath).joinpath(name).relative_to(root)
+                     for name in dirnames + filenames)
+
+    return {path: root.joinpath(path).stat() for path in paths}
+
+
+def make_tree(root, count):
+    paths = []
+    for i in range(count):
+        path = os.path.join(str(root), 'dir{}'.format(i // 1000), 'file{}.dat'.format(i))
+        if i % 1000 == 0:
+            os.mkdir(os.path.dirname(path))
+
+        with open(path, 'wb') as f:
+            f.write(b'x')
+
+        paths.append(path)
+
+    return paths
+
+
+def touch_some(paths, fraction=0.001):
+    for path in random.sample(paths, max(int(len(paths) * fraction), 1)):
+        with open(path, 'ab') as f:
+            f.write(b'x')
+
+
+def measure_tree_tick(take_snapshot, diff, paths):
+    # Each tick is measured against a fresh baseline snapshot with some of the files changed
+    best = None
+    for _ in range(3):
+        old = take_snapshot()
+        touch_some(paths)
+        start = time.process_time()
+        diff(old, take_snapshot())
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def measure(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        func(*args)
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main(counts, tree_counts):
+    for count in counts:
+        old_entries = make_entries(count)
+        new_entries = mutate(old_entries)
+        print('{:,} files (synthetic snapshots, diff only):'.format(count))
+
+        old_stats, new_stats = dict(old_entries), dict(new_entries)
+        print('  legacy, str keys:             {:8.3f} s'.format(
+            measure(legacy_diff, old_stats, new_stats)))
+        old_stats = {Path(path): stat for path, stat in old_entries}
+        new_stats = {Path(path): stat for path, stat in new_entries}
+        print('  legacy, Path keys (original): {:8.3f} s'.format(
+            measure(legacy_diff, old_stats, new_stats)))
+
+        old, new = Snapshot(old_entries), Snapshot(new_entries)
+        print('  unchanged tick:               {:8.3f} s'.format(
+            measure(diff_snapshots, old, Snapshot(old_entries))))
+        print('  changed tick:                 {:8.3f} s'.format(
+            measure(diff_snapshots, old, new)))
+        print('  changed tick incl. snapshots: {:8.3f} s'.format(
+            measure(lambda: diff_snapshots(Snapshot(old_entries), Snapshot(new_entries)))))
+
+    for count in tree_counts:
+        print('{:,} files (real tree, stat collection and diff):'.format(count))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            paths = make_tree(root, count)
+            print('  legacy (original):            {:8.3f} s'.format(
+                measure_tree_tick(lambda: legacy_collect_stats(root), legacy_diff, paths)))
+            watcher = PollingFileWatcher(root, 1)
+            print('  merge join:                   {:8.3f} s'.format(
+                measure_tree_tick(lambda: watcher._take_snapshots()[0], diff_snapshots, paths)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the CPU time of polling ticks.')
+    parser.add_argument('counts', metavar='N', type=int, nargs='*',
+                        default=[100000, 1000000],
+                        help='numbers of files in the synthetic snapshots')
+    parser.add_argument('--tree-files', metavar='N', type=int, nargs='+',
+                        default=[10000, 100000],
+                        help='numbers of files in the real trees')
+    args = parser.parse_args()
+    main(args.counts, args.tree_files)
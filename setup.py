@@ -42,6 +42,7 @@ setup(
     ],
     install_requires=[
         'asphalt ~= 2.0',
+        'async_generator >= 1.6',
         'cffi >= 1.8.1; platform_system == "Linux" or platform_system == "Windows"'
     ],
     entry_points={
@@ -51,7 +52,9 @@ setup(
         'asphalt.watcher.watchers': [
             'inotify = asphalt.filewatcher.watchers.inotify:INotifyFileWatcher',
             'kqueue = asphalt.filewatcher.watchers.kqueue:KQueueFileWatcher',
+            'memory = asphalt.filewatcher.watchers.memory:MemoryFileWatcher',
             'poll = asphalt.filewatcher.watchers.poll:PollingFileWatcher',
+            'subscriber = asphalt.filewatcher.watchers.subscriber:SubscriberFileWatcher',
             'windows = asphalt.filewatcher.watchers.windows:WindowsFileWatcher'
         ]
     }
@@ -0,0 +1,30 @@
+import pytest
+
+from asphalt.filewatcher.api import FileWatcher
+
+
+class DummyFileWatcher(FileWatcher):
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+@pytest.fixture
+def watcher_class():
+    return DummyFileWatcher
+
+
+@pytest.fixture
+def watcher():
+    return DummyFileWatcher(['/foo', '/bar'])
+
+
+@pytest.fixture
+def events(watcher):
+    events = []
+    for topic in ('created', 'modified', 'deleted', 'directory_changed'):
+        getattr(watcher, topic).connect(events.append)
+
+    return events
@@ -0,0 +1,87 @@
+from asyncio import sleep
+from pathlib import Path
+
+import pytest
+
+from asphalt.filewatcher.api import FileEventType
+
+
+@pytest.mark.parametrize('include_paths', [False, True], ids=['counts', 'paths'])
+@pytest.mark.asyncio
+async def test_burst(watcher, events, include_paths):
+    aggregator = watcher.aggregate_directories(2, window=0.1, include_paths=include_paths)
+    for i in range(5):
+        watcher._dispatch(FileEventType.create, Path('checkout') / 'file{}'.format(i))
+
+    watcher._dispatch(FileEventType.modify, Path('checkout') / 'file0')
+    watcher._dispatch(FileEventType.modify, Path('other') / 'file')
+    await sleep(0)
+    assert [(event.topic, event.path) for event in events] == [
+        ('created', Path('checkout/file0')), ('created', Path('checkout/file1')),
+        ('modified', Path('other/file'))]
+    assert aggregator.suppressed == 4
+
+    await sleep(0.15)
+    summary = events[-1]
+    assert summary.topic == 'directory_changed'
+    assert summary.fullpath == Path('/foo/checkout')
+    assert summary.counts == {FileEventType.create: 3, FileEventType.modify: 1}
+    if include_paths:
+        names = ['file2', 'file3', 'file4', 'file0']
+        assert summary.paths == [Path('checkout') / name for name in names]
+    else:
+        assert summary.paths is None
+
+
+@pytest.mark.asyncio
+async def test_burst_continues(watcher, events):
+    watcher.aggregate_directories(1, window=0.1)
+    for _ in range(2):
+        watcher._dispatch(FileEventType.modify, Path('file'))
+
+    await sleep(0.15)
+    assert [event.topic for event in events] == ['modified', 'directory_changed']
+
+    # The burst is still going on, so everything gets summarized
+    watcher._dispatch(FileEventType.modify, Path('file'))
+    await sleep(0.1)
+    assert [event.topic for event in events] == ['modified', 'directory_changed',
+                                                 'directory_changed']
+
+    # After a quiet window, events are delivered individually again
+    await sleep(0.15)
+    watcher._dispatch(FileEventType.modify, Path('file'))
+    await sleep(0)
+    assert events[-1].topic == 'modified'
+
+
+def test_invalid(watcher):
+    pytest.raises(ValueError, watcher.aggregate_directories, 0).match(
+        'threshold must be a positive integer')
+    pytest.raises(ValueError, watcher.aggregate_directories, 1, window=0).match(
+        'window must be positive')
+    watcher.aggregate_directories(1)
+    pytest.raises(RuntimeError, watcher.aggregate_directories, 1)
+
+
+@pytest.mark.asyncio
+async def test_sinks(watcher, tmpdir):
+    watcher.aggregate_directories(1, window=0.05, include_paths=True)
+    journal = watcher.open_journal(str(tmpdir))
+    dirty_set = watcher.track_dirty()
+    for name in ('a.txt', 'b.txt', 'c.txt'):
+        watcher._dispatch(FileEventType.create, Path('burst', name))
+
+    await sleep(0.1)
+    assert dirty_set.drain() == {Path('/foo/burst/a.txt'): {FileEventType.create},
+                                 Path('/foo/burst'): {FileEventType.create}}
+
+    records = []
+    async for seq, event in journal.replay():
+        records.append((seq, event.topic, event.path))
+
+    assert records == [(1, 'created', Path('burst', 'a.txt')),
+                       (2, 'directory_changed', Path('burst'))]
+    assert event.counts == {FileEventType.create: 2}
+    assert event.paths == [Path('burst', 'b.txt'), Path('burst', 'c.txt')]
+    journal.close()
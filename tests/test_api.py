@@ -1,17 +1,28 @@
 from pathlib import Path
 
-from asphalt.filewatcher.api import FilesystemEvent, FileWatcher
+import pytest
 
+from asphalt.filewatcher.api import FilesystemEvent
 
-class DummyFileWatcher(FileWatcher):
-    def start(self) -> None:
-        pass
 
-    def stop(self) -> None:
-        pass
-
-
-def test_fullpath():
+def test_fullpath(watcher):
     root = Path('/foo')
-    event = FilesystemEvent(DummyFileWatcher(root), 'created', root / 'file.dat')
+    event = FilesystemEvent(watcher, 'created', root / 'file.dat')
     assert event.fullpath == Path('/foo/file.dat')
+
+
+def test_multiple_roots(watcher):
+    assert watcher.paths == (Path('/foo'), Path('/bar'))
+    assert watcher.path == Path('/foo')
+    event = FilesystemEvent(watcher, 'created', Path('file.dat'), Path('/bar'))
+    assert event.fullpath == Path('/bar/file.dat')
+
+
+@pytest.mark.parametrize('paths', [
+    ['/foo', '/foo'],
+    ['/foo', '/foo/bar'],
+    ['/foo/bar', '/foo']
+], ids=['same', 'child', 'parent'])
+def test_overlapping_roots(watcher_class, paths):
+    exc = pytest.raises(ValueError, watcher_class, paths)
+    exc.match('overlapping watched paths')
@@ -0,0 +1,87 @@
+from asyncio import wait_for, get_event_loop, sleep, TimeoutError
+from pathlib import Path
+
+import pytest
+
+from asphalt.filewatcher.api import FileEventType
+
+
+def test_drain(watcher):
+    dirty_set = watcher.track_dirty()
+    for _ in range(1000):
+        watcher._dispatch(FileEventType.modify, Path('hot.log'))
+
+    watcher._dispatch(FileEventType.create, Path('new.txt'), Path('/bar'))
+    watcher._dispatch(FileEventType.delete, Path('hot.log'))
+    assert len(dirty_set) == 2
+    assert dirty_set.drain() == {
+        Path('/foo/hot.log'): {FileEventType.modify, FileEventType.delete},
+        Path('/bar/new.txt'): {FileEventType.create}
+    }
+    assert len(dirty_set) == 0
+    assert dirty_set.drain() == {}
+
+
+def test_events(watcher):
+    dirty_set = watcher.track_dirty(events=[FileEventType.create])
+    watcher._dispatch(FileEventType.modify, Path('hot.log'))
+    assert len(dirty_set) == 0
+
+    dirty_set.close()
+    watcher._dispatch(FileEventType.create, Path('new.txt'))
+    assert len(dirty_set) == 0
+
+
+@pytest.mark.asyncio
+async def test_wait_dirty(watcher):
+    dirty_set = watcher.track_dirty()
+    get_event_loop().call_later(0.1, watcher._dispatch, FileEventType.create, Path('new.txt'))
+    await wait_for(dirty_set.wait_dirty(), 1)
+    assert list(dirty_set.drain()) == [Path('/foo/new.txt')]
+
+    with pytest.raises(TimeoutError):
+        await wait_for(dirty_set.wait_dirty(), 0.1)
+
+
+@pytest.mark.asyncio
+async def test_close_wakes_waiters(watcher):
+    dirty_set = watcher.track_dirty()
+    waiter = get_event_loop().create_task(dirty_set.wait_dirty())
+    await sleep(0)
+    dirty_set.close()
+    with pytest.raises(RuntimeError) as exc:
+        await wait_for(waiter, 1)
+
+    exc.match('the dirty set has been closed')
+
+
+@pytest.mark.asyncio
+async def test_wait_dirty_after_close(watcher):
+    dirty_set = watcher.track_dirty()
+    watcher._dispatch(FileEventType.create, Path('new.txt'))
+    dirty_set.close()
+    await wait_for(dirty_set.wait_dirty(), 1)
+    assert list(dirty_set.drain()) == [Path('/foo/new.txt')]
+    with pytest.raises(RuntimeError):
+        await wait_for(dirty_set.wait_dirty(), 1)
+
+
+@pytest.mark.asyncio
+async def test_two_waiters(watcher):
+    dirty_set = watcher.track_dirty()
+    drained = []
+
+    async def consume():
+        await dirty_set.wait_dirty()
+        drained.append(dirty_set.drain())
+
+    consumers = [get_event_loop().create_task(consume()) for _ in range(2)]
+    await sleep(0)
+    watcher._dispatch(FileEventType.create, Path('a.txt'))
+    await sleep(0.05)
+    assert drained == [{Path('/foo/a.txt'): {FileEventType.create}}]
+    assert not consumers[1].done()
+
+    watcher._dispatch(FileEventType.create, Path('b.txt'))
+    await wait_for(consumers[1], 1)
+    assert drained[1] == {Path('/foo/b.txt'): {FileEventType.create}}
@@ -0,0 +1,111 @@
+import logging
+import threading
+from asyncio import sleep
+from pathlib import Path
+
+import pytest
+
+from asphalt.filewatcher.api import FileEventType
+
+
+async def wait_idle(executor):
+    for _ in range(100):
+        if not executor.in_flight:
+            return
+
+        await sleep(0.02)
+
+    pytest.fail('the executor did not finish processing the events in time')
+
+
+@pytest.mark.asyncio
+async def test_per_path_ordering(watcher):
+    processed = []
+    executor = watcher.offload(lambda topic, path: processed.append((topic, path)),
+                               concurrency=4)
+    for event_type in (FileEventType.create, FileEventType.modify, FileEventType.delete):
+        for name in ('a', 'b', 'c'):
+            watcher._dispatch(event_type, Path(name))
+
+    await wait_idle(executor)
+    executor.close()
+    for name in ('a', 'b', 'c'):
+        topics = [topic for topic, path in processed if path == Path('/foo', name)]
+        assert topics == ['created', 'modified', 'deleted']
+
+
+@pytest.mark.asyncio
+async def test_parallel_paths(watcher):
+    # Pick one path for each shard so that the two events must be processed in parallel
+    paths = {hash(Path(str(i))) % 2: Path(str(i)) for i in range(100)}
+    barrier = threading.Barrier(2, timeout=2)
+    executor = watcher.offload(lambda topic, path: barrier.wait(), concurrency=2)
+    for path in paths.values():
+        watcher._dispatch(FileEventType.create, path)
+
+    await wait_idle(executor)
+    executor.close()
+    assert not barrier.broken
+
+
+@pytest.mark.asyncio
+async def test_event_filter(watcher):
+    processed = []
+    executor = watcher.offload(lambda topic, path: processed.append(topic),
+                               events=[FileEventType.modify])
+    watcher._dispatch(FileEventType.create, Path('a'))
+    watcher._dispatch(FileEventType.modify, Path('a'))
+    await wait_idle(executor)
+    executor.close()
+    assert processed == ['modified']
+
+
+@pytest.mark.asyncio
+async def test_max_in_flight(watcher):
+    event = threading.Event()
+    processed = []
+
+    def process(topic, path):
+        event.wait(2)
+        processed.append((topic, path.name))
+
+    executor = watcher.offload(process, concurrency=1, max_in_flight=2)
+    for name in ('a', 'b', 'c', 'd'):
+        watcher._dispatch(FileEventType.create, Path(name))
+
+    watcher._dispatch(FileEventType.modify, Path('c'))
+    watcher._dispatch(FileEventType.delete, Path('c'))
+    assert executor.in_flight == 2
+    assert executor.overloaded
+    assert executor.dropped == 2
+    event.set()
+    await wait_idle(executor)
+    executor.close()
+    assert not executor.overloaded
+    assert processed == [('created', 'a'), ('created', 'b'), ('deleted', 'c'), ('created', 'd')]
+
+
+@pytest.mark.asyncio
+async def test_overload_logging(watcher, caplog):
+    caplog.set_level(logging.INFO)
+    event = threading.Event()
+    executor = watcher.offload(lambda topic, path: event.wait(2), concurrency=1,
+                               max_in_flight=1)
+    for _ in range(5):
+        watcher._dispatch(FileEventType.modify, Path('a'))
+
+    event.set()
+    await wait_idle(executor)
+    executor.close()
+    messages = [record.getMessage() for record in caplog.records
+                if record.name == 'asphalt.filewatcher.executor']
+    assert messages == [
+        'too many events in flight (1); holding back further events until the backlog has been '
+        'worked down',
+        'backlog of events worked down; 3 events were lost while overloaded'
+    ]
+
+
+def test_invalid_concurrency(watcher):
+    exc = pytest.raises(ValueError, watcher.offload, print, concurrency=0)
+    exc.match('concurrency must be a positive integer')
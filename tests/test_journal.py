@@ -0,0 +1,109 @@
+from asyncio import sleep, wait_for, get_event_loop
+from pathlib import Path
+
+import pytest
+
+from asphalt.filewatcher.api import FileEventType
+
+
+async def collect(journal, from_seq=1):
+    records = []
+    async for seq, event in journal.replay(from_seq):
+        records.append((seq, event.topic, event.root, event.path))
+
+    return records
+
+
+@pytest.mark.asyncio
+async def test_replay(watcher, tmpdir):
+    journal = watcher.open_journal(str(tmpdir))
+    watcher._dispatch(FileEventType.create, Path('a.txt'))
+    watcher._dispatch(FileEventType.modify, Path('sub', 'b.txt'), Path('/bar'))
+    watcher._dispatch(FileEventType.delete, Path('a.txt'))
+    assert journal.last_seq == 3
+    assert await collect(journal) == [
+        (1, 'created', Path('/foo'), Path('a.txt')),
+        (2, 'modified', Path('/bar'), Path('sub', 'b.txt')),
+        (3, 'deleted', Path('/foo'), Path('a.txt'))
+    ]
+    assert await collect(journal, 3) == [(3, 'deleted', Path('/foo'), Path('a.txt'))]
+    journal.close()
+
+
+@pytest.mark.asyncio
+async def test_segment_rotation(watcher, tmpdir):
+    journal = watcher.open_journal(str(tmpdir), segment_size=100, max_segments=3)
+    for i in range(20):
+        watcher._dispatch(FileEventType.modify, Path('file{}.txt'.format(i)))
+
+    segments = sorted(path.basename for path in tmpdir.listdir())
+    assert len(segments) == 3
+
+    # The oldest events have been deleted, so replay starts from the oldest available one
+    records = await collect(journal)
+    assert records[-1] == (20, 'modified', Path('/foo'), Path('file19.txt'))
+    assert [record[0] for record in records] == list(range(records[0][0], 21))
+    assert records[0][0] == int(segments[0].split('.')[0])
+    journal.close()
+
+
+@pytest.mark.asyncio
+async def test_reopen(watcher, tmpdir):
+    journal = watcher.open_journal(str(tmpdir))
+    watcher._dispatch(FileEventType.create, Path('a.txt'))
+    journal.close()
+
+    # Simulate a crash in the middle of writing a record
+    segment = tmpdir.listdir()[0]
+    segment.write(b'\x00' * 5, mode='ab')
+
+    watcher.journal = None
+    journal = watcher.open_journal(str(tmpdir))
+    watcher._dispatch(FileEventType.delete, Path('a.txt'))
+    assert await collect(journal) == [
+        (1, 'created', Path('/foo'), Path('a.txt')),
+        (2, 'deleted', Path('/foo'), Path('a.txt'))
+    ]
+    journal.close()
+
+
+@pytest.mark.asyncio
+async def test_follow(watcher, tmpdir):
+    async def consume():
+        async for seq, event in journal.replay(follow=True):
+            received.append(seq)
+
+    received = []
+    journal = watcher.open_journal(str(tmpdir))
+    watcher._dispatch(FileEventType.create, Path('a.txt'))
+    task = get_event_loop().create_task(consume())
+    await sleep(0.1)
+    assert received == [1]
+
+    watcher._dispatch(FileEventType.modify, Path('a.txt'))
+    await sleep(0.1)
+    assert received == [1, 2]
+
+    journal.close()
+    await wait_for(task, 1)
+
+
+@pytest.mark.asyncio
+async def test_replay_in_chunks(watcher, tmpdir):
+    async def tick():
+        while True:
+            ticks.append(None)
+            await sleep(0)
+
+    ticks = []
+    journal = watcher.open_journal(str(tmpdir))
+    journal.replay_chunk_size = 10
+    for i in range(50):
+        watcher._dispatch(FileEventType.modify, Path('file{}.txt'.format(i)))
+
+    task = get_event_loop().create_task(tick())
+    records = await collect(journal, 5)
+    task.cancel()
+    assert [record[0] for record in records] == list(range(5, 51))
+    assert len(ticks) >= 5
+    journal.close()
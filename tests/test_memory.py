@@ -0,0 +1,93 @@
+from asyncio import sleep, get_event_loop
+from pathlib import Path
+
+import pytest
+
+from asphalt.filewatcher.api import FileEventType
+from asphalt.filewatcher.component import create_watcher
+
+
+@pytest.fixture
+def watcher():
+    watcher = create_watcher('/fake', FileEventType.all, backend='memory',
+                             tree=['existing.txt', 'subdir/nested.txt', 'emptydir/'])
+    yield watcher
+    watcher.stop()
+
+
+@pytest.fixture
+def events(watcher):
+    events = []
+    for topic in ('accessed', 'attribute_changed', 'created', 'deleted', 'modified', 'settled'):
+        getattr(watcher, topic).connect(events.append)
+
+    return events
+
+
+@pytest.mark.asyncio
+async def test_fake_tree(watcher, events):
+    watcher.start()
+    watcher.create('subdir/new.txt')
+    watcher.modify('subdir/new.txt')
+    watcher.settle('subdir/new.txt')
+    watcher.access('existing.txt')
+    watcher.change_attributes('emptydir')
+    watcher.delete('subdir')
+    await sleep(0)
+    assert [(event.topic, event.path) for event in events] == [
+        ('created', Path('subdir/new.txt')),
+        ('modified', Path('subdir/new.txt')),
+        ('settled', Path('subdir/new.txt')),
+        ('accessed', Path('existing.txt')),
+        ('attribute_changed', Path('emptydir')),
+        ('deleted', Path('subdir/nested.txt')),
+        ('deleted', Path('subdir/new.txt')),
+        ('deleted', Path('subdir'))
+    ]
+    assert all(event.root == Path('/fake') for event in events)
+    assert not watcher.exists('subdir/nested.txt')
+
+
+def test_fake_tree_errors(watcher):
+    pytest.raises(FileExistsError, watcher.create, 'existing.txt')
+    pytest.raises(FileNotFoundError, watcher.create, 'nonexistent/foo.txt')
+    pytest.raises(FileNotFoundError, watcher.create, 'existing.txt/foo.txt')
+    pytest.raises(FileNotFoundError, watcher.modify, 'nonexistent.txt')
+    exc = pytest.raises(ValueError, watcher.modify, 'existing.txt', root='/other')
+    exc.match('/other is not a watched root path')
+
+
+@pytest.mark.asyncio
+async def test_report_existing():
+    watcher = create_watcher('/fake', FileEventType.all, backend='memory', report_existing=True,
+                             tree=['subdir/nested.txt', 'emptydir/'])
+    events = []
+    watcher.scanned.connect(events.append)
+    watcher.start()
+    await sleep(0)
+    assert events[0].paths == [Path('emptydir'), Path('subdir'), Path('subdir/nested.txt')]
+
+
+@pytest.mark.parametrize('speed', [1, None], ids=['realtime', 'fast'])
+@pytest.mark.asyncio
+async def test_trace(speed):
+    trace = [(100, 'create', 'foo.txt'), (100.1, 'modify', 'foo.txt'),
+             (100.1, 'access', 'foo.txt'), (100.1, 'delete', 'sub/bar.txt', '/other'),
+             (100.2, FileEventType.delete, 'foo.txt')]
+    watcher = create_watcher(['/fake', '/other'], 'create,modify,delete', recursive=False,
+                             backend='memory', trace=trace, speed=speed)
+    events = []
+    watcher.created.connect(events.append)
+    watcher.modified.connect(events.append)
+    watcher.deleted.connect(events.append)
+    start_time = get_event_loop().time()
+    watcher.start()
+    await watcher._replay_task
+    await sleep(0)
+    elapsed = get_event_loop().time() - start_time
+    assert [(event.topic, event.path, event.root) for event in events] == [
+        ('created', Path('foo.txt'), Path('/fake')),
+        ('modified', Path('foo.txt'), Path('/fake')),
+        ('deleted', Path('foo.txt'), Path('/fake'))
+    ]
+    assert (elapsed >= 0.2) is (speed == 1)
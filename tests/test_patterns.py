@@ -0,0 +1,102 @@
+import re
+from asyncio import sleep
+from pathlib import Path
+
+import pytest
+
+from asphalt.filewatcher.api import FileEventType
+from asphalt.filewatcher.patterns import translate, PatternIndex
+
+
+@pytest.mark.parametrize('pattern, path, matches', [
+    ('*.py', 'foo.py', True),
+    ('*.py', 'a/b/foo.py', True),
+    ('*.py', 'foo.pyc', False),
+    ('src/*.py', 'src/foo.py', True),
+    ('src/*.py', 'src/sub/foo.py', False),
+    ('src/**/*.py', 'src/foo.py', True),
+    ('src/**/*.py', 'src/sub/foo.py', True),
+    ('config/**', 'config', True),
+    ('config/**', 'config/a/b.yaml', True),
+    ('config/**', 'configs/a.yaml', False),
+    ('log?.txt', 'log1.txt', True),
+    ('log?.txt', 'log10.txt', False),
+    ('[!a]*.txt', 'abc.txt', False),
+    ('[!a]*.txt', 'bcd.txt', True)
+])
+def test_translate(pattern, path, matches):
+    assert bool(re.fullmatch(translate(pattern), path)) is matches
+
+
+def test_index():
+    index = PatternIndex()
+    callbacks = [lambda event, i=i: i for i in range(6)]
+    index.add('*.yaml', callbacks[0])
+    index.add('**/*.tar.gz', callbacks[1])
+    index.add('Makefile', callbacks[2])
+    index.add('config/app.yaml', callbacks[3])
+    index.add('config/**', callbacks[4])
+    index.add('*/app.*', callbacks[5])
+    assert len(index) == 6
+    assert index.match('config/app.yaml') == [callbacks[0], callbacks[3], callbacks[4],
+                                              callbacks[5]]
+    assert index.match('dist/foo-1.0.tar.gz') == [callbacks[1]]
+    assert index.match('sub/Makefile') == [callbacks[2]]
+    assert index.match('app.yaml') == [callbacks[0]]
+    assert index.match('README') == []
+
+
+def test_index_buckets():
+    index = PatternIndex()
+    for i in range(100):
+        index.add('dir{}/**/*.cfg'.format(i), i)
+
+    index.add('*/sub/*.cfg', 'unprefixed')
+    assert index.match('dir7/a/b.cfg') == [7]
+    assert index.match('dir7/sub/b.cfg') == [7, 'unprefixed']
+    assert index.match('dir7/a/b.txt') == []
+    assert index.match('other/sub/b.cfg') == ['unprefixed']
+
+
+def test_index_remove():
+    index = PatternIndex()
+    callback = object()
+    index.add('*.yaml', callback)
+    index.add('*.yml', callback)
+    index.add('config/*', callback)
+    assert index.match('config/app.yaml') == [callback]
+
+    index.remove(callback, '*.yaml')
+    assert index.match('app.yaml') == []
+    assert index.match('config/app.yaml') == [callback]
+
+    index.remove(callback)
+    assert len(index) == 0
+    assert index.match('config/app.yml') == []
+
+
+@pytest.mark.asyncio
+async def test_subscribe(watcher):
+    events = []
+
+    async def async_callback(event):
+        events.append(('async', event.path))
+
+    watcher.subscribe('modified', lambda event: events.append(('yaml', event.path)),
+                      pattern='**/*.yaml')
+    watcher.subscribe('modified', async_callback, pattern='config/*')
+    watcher._dispatch(FileEventType.modify, Path('config') / 'app.yaml')
+    watcher._dispatch(FileEventType.modify, Path('app.json'))
+    watcher._dispatch(FileEventType.create, Path('app.yaml'))
+    await sleep(0)
+    assert events == [('yaml', Path('config/app.yaml')), ('async', Path('config/app.yaml'))]
+
+    watcher.unsubscribe('modified', async_callback)
+    watcher._dispatch(FileEventType.modify, Path('config') / 'foo.txt')
+    await sleep(0)
+    assert len(events) == 2
+
+
+def test_subscribe_invalid_topic(watcher):
+    exc = pytest.raises(ValueError, watcher.subscribe, 'foo', print, pattern='*')
+    exc.match('invalid topic: foo')
@@ -0,0 +1,139 @@
+from asyncio import Queue, wait_for, sleep, start_unix_server
+from pathlib import Path
+
+import pytest
+
+from asphalt.filewatcher.api import FileEventType
+from asphalt.filewatcher.component import create_watcher
+from asphalt.filewatcher.journal import _record_header
+from asphalt.filewatcher.publisher import _make_frame, _encode_roots, FRAME_ROOTS, FRAME_EVENTS
+
+
+@pytest.fixture
+def socket_path(tmpdir):
+    return Path(str(tmpdir), 'watcher.sock')
+
+
+@pytest.fixture
+def roots(tmpdir):
+    return Path(str(tmpdir.mkdir('foo'))), Path(str(tmpdir.mkdir('bar')))
+
+
+@pytest.mark.asyncio
+async def test_publish_subscribe(watcher_class, socket_path, roots):
+    foo, bar = roots
+    watcher = watcher_class(roots)
+    publisher = watcher.publish(socket_path)
+    await publisher.start()
+
+    subscriber = create_watcher([bar], events='create,modify', backend='subscriber',
+                                socket_path=socket_path, reconnect_delay=0.1)
+    queue = Queue()
+    subscriber.created.connect(queue.put)
+    subscriber.modified.connect(queue.put)
+    subscriber.start()
+    try:
+        # Wait for the subscriber to connect
+        for _ in range(50):
+            if publisher._writers:
+                break
+
+            await sleep(0.02)
+
+        watcher._dispatch(FileEventType.create, Path('a.txt'), bar)
+        watcher._dispatch(FileEventType.create, Path('b.txt'), foo)
+        watcher._dispatch(FileEventType.delete, Path('a.txt'), bar)
+        watcher._dispatch(FileEventType.modify, Path('sub', 'c.txt'), bar)
+
+        event = await wait_for(queue.get(), 2)
+        assert event.source is subscriber
+        assert (event.topic, event.root, event.path) == ('created', bar, Path('a.txt'))
+        event = await wait_for(queue.get(), 2)
+        assert (event.topic, event.root, event.path) == \
+            ('modified', bar, Path('sub', 'c.txt'))
+        assert queue.empty()
+    finally:
+        subscriber.stop()
+        publisher.close()
+
+    assert not socket_path.exists()
+
+
+@pytest.mark.asyncio
+async def test_directory_summary(watcher_class, socket_path, roots):
+    foo, bar = roots
+    watcher = watcher_class(roots)
+    watcher.aggregate_directories(1, window=0.05, include_paths=True)
+    publisher = watcher.publish(socket_path)
+    await publisher.start()
+
+    subscriber = create_watcher([bar], events='create', backend='subscriber',
+                                socket_path=socket_path, reconnect_delay=0.1)
+    queue = Queue()
+    subscriber.created.connect(queue.put)
+    subscriber.directory_changed.connect(queue.put)
+    subscriber.start()
+    try:
+        for _ in range(50):
+            if publisher._writers:
+                break
+
+            await sleep(0.02)
+
+        for name in ('a.txt', 'b.txt', 'c.txt'):
+            watcher._dispatch(FileEventType.create, Path('burst', name), bar)
+
+        watcher._dispatch(FileEventType.modify, Path('burst', 'a.txt'), bar)
+        event = await wait_for(queue.get(), 2)
+        assert (event.topic, event.path) == ('created', Path('burst', 'a.txt'))
+        event = await wait_for(queue.get(), 2)
+        assert event.topic == 'directory_changed'
+        assert event.source is subscriber
+        assert (event.root, event.path) == (bar, Path('burst'))
+        assert event.counts == {FileEventType.create: 2}
+        assert event.paths == [Path('burst', 'b.txt'), Path('burst', 'c.txt'),
+                               Path('burst', 'a.txt')]
+    finally:
+        subscriber.stop()
+        publisher.close()
+
+
+@pytest.mark.parametrize('record', [
+    _record_header.pack(1, 0, 99, 0, 1) + b'a',
+    _record_header.pack(1, 0, FileEventType.create.value, 5, 1) + b'a',
+    _record_header.pack(1, 0, FileEventType.create.value, 0, 5) + b'a'
+], ids=['event_type', 'root', 'truncated'])
+@pytest.mark.asyncio
+async def test_malformed_frame(socket_path, roots, record, caplog):
+    foo, bar = roots
+    good_record = _record_header.pack(2, 0, FileEventType.create.value, 0, 1) + b'b'
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        writer.write(_make_frame(FRAME_ROOTS, _encode_roots(roots)))
+        writer.write(_make_frame(FRAME_EVENTS, record if len(connections) == 1 else good_record))
+
+    server = await start_unix_server(handle, str(socket_path))
+    subscriber = create_watcher([foo], events='create', backend='subscriber',
+                                socket_path=socket_path, reconnect_delay=0.1)
+    queue = Queue()
+    subscriber.created.connect(queue.put)
+    subscriber.start()
+    try:
+        event = await wait_for(queue.get(), 2)
+        assert event.path == Path('b')
+        assert len(connections) == 2
+        assert 'Received a malformed frame from the event publisher' in caplog.text
+    finally:
+        subscriber.stop()
+        for writer in connections:
+            writer.close()
+
+        server.close()
+
+
+def test_report_existing(socket_path):
+    exc = pytest.raises(ValueError, create_watcher, '/foo', 'create', backend='subscriber',
+                        report_existing=True, socket_path=socket_path)
+    exc.match('the subscriber backend does not support report_existing')
@@ -0,0 +1,98 @@
+from asyncio import sleep
+from pathlib import Path
+
+import pytest
+
+from asphalt.filewatcher.api import FileEventType
+from asphalt.filewatcher.component import FileWatcherComponent
+
+
+def dispatch_many(watcher, event_type, path, count):
+    for _ in range(count):
+        watcher._dispatch(event_type, path)
+
+
+@pytest.mark.asyncio
+async def test_trailing_event(watcher, events):
+    rule = watcher.limit_rate(10, burst=2)
+    dispatch_many(watcher, FileEventType.modify, Path('hot.log'), 10)
+    watcher._dispatch(FileEventType.delete, Path('hot.log'))
+    await sleep(0)
+    assert [event.topic for event in events] == ['modified', 'modified']
+    assert rule.suppressed == 9
+    assert watcher.rate_limiter.suppressed == 9
+
+    # The suppressed events are folded into one event of each type
+    await sleep(0.15)
+    assert [event.topic for event in events] == ['modified', 'modified', 'modified', 'deleted']
+
+
+@pytest.mark.asyncio
+async def test_per_path_buckets(watcher, events):
+    watcher.limit_rate(1)
+    dispatch_many(watcher, FileEventType.modify, Path('hot.log'), 5)
+    watcher._dispatch(FileEventType.create, Path('other.dat'))
+    await sleep(0)
+    assert [(event.topic, event.path) for event in events] == [
+        ('modified', Path('hot.log')), ('created', Path('other.dat'))]
+
+
+@pytest.mark.asyncio
+async def test_pattern(watcher, events):
+    watcher.limit_rate(1, pattern='*.log')
+    dispatch_many(watcher, FileEventType.modify, Path('hot.log'), 5)
+    dispatch_many(watcher, FileEventType.modify, Path('other.dat'), 5)
+    await sleep(0)
+    assert len(events) == 6
+
+
+@pytest.mark.asyncio
+async def test_pattern_anchored(watcher, events):
+    # Patterns containing a slash are anchored at the root, like with subscribe()
+    watcher.limit_rate(1, pattern='logs/*.log')
+    dispatch_many(watcher, FileEventType.modify, Path('logs', 'x.log'), 3)
+    dispatch_many(watcher, FileEventType.modify, Path('a', 'logs', 'x.log'), 3)
+    await sleep(0)
+    assert len(events) == 4
+
+
+@pytest.mark.asyncio
+async def test_shared_bucket(watcher, events):
+    rule = watcher.limit_rate(1, pattern='*.log', shared=True)
+    watcher._dispatch(FileEventType.modify, Path('a.log'))
+    watcher._dispatch(FileEventType.modify, Path('b.log'))
+    await sleep(0)
+    assert [event.path for event in events] == [Path('a.log')]
+    assert rule.suppressed == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_bucket_distinct_paths(watcher, events):
+    # Each path's folded events cost a token, so distinct paths cannot bypass a shared bucket
+    watcher.limit_rate(10, pattern='*.log', shared=True)
+    for i in range(100):
+        watcher._dispatch(FileEventType.modify, Path('{}.log'.format(i)))
+
+    watcher._dispatch(FileEventType.delete, Path('1.log'))
+    await sleep(0.25)
+    assert [(event.topic, event.path) for event in events] == [
+        ('modified', Path('0.log')), ('modified', Path('1.log')), ('deleted', Path('1.log')),
+        ('modified', Path('2.log'))]
+
+
+@pytest.mark.parametrize('kwargs, message', [
+    ({'rate': 0}, 'rate must be positive'),
+    ({'rate': 1, 'burst': 0}, 'burst must be a positive integer')
+], ids=['rate', 'burst'])
+def test_invalid_rule(watcher, kwargs, message):
+    exc = pytest.raises(ValueError, watcher.limit_rate, **kwargs)
+    exc.match(message)
+
+
+@pytest.mark.asyncio
+async def test_component_shutdown(watcher, events):
+    watcher.limit_rate(10, burst=1)
+    dispatch_many(watcher, FileEventType.modify, Path('hot.log'), 3)
+    await FileWatcherComponent.shutdown(None, watcher, 'default')
+    await sleep(0.15)
+    assert len(events) == 1
@@ -0,0 +1,39 @@
+import os
+
+from asphalt.filewatcher.snapshot import Snapshot, SnapshotDiff, diff_snapshots
+
+
+def make_stat(mode=0o100644, uid=1000, gid=1000, size=5, atime=1, mtime=1):
+    return os.stat_result((mode, 0, 0, 1, uid, gid, size, 0, 0, 0, None, None, None, atime,
+                           mtime, 0))
+
+
+def test_snapshot():
+    snap = Snapshot([('b', make_stat()), ('a', make_stat(mode=0o40755)), ('.', make_stat())])
+    assert snap.paths == ['.', 'a', 'b']
+    assert len(snap) == 3
+    assert 'a' in snap
+    assert 'c' not in snap
+    assert snap.get_mode('a') == 0o40755
+    assert snap.get_mode('c') is None
+
+
+def test_diff_unchanged():
+    old = Snapshot([('a', make_stat()), ('b', make_stat())])
+    new = Snapshot([('b', make_stat()), ('a', make_stat())])
+    assert diff_snapshots(old, new) == SnapshotDiff([], [], [], [], [])
+
+
+def test_diff_same_paths():
+    old = Snapshot([('a', make_stat()), ('b', make_stat()), ('c', make_stat())])
+    new = Snapshot([('a', make_stat(atime=2)), ('b', make_stat(uid=0)),
+                    ('c', make_stat(size=6, atime=2))])
+    assert diff_snapshots(old, new) == SnapshotDiff([], [], ['a', 'c'], ['b'], ['c'])
+
+
+def test_diff_merge():
+    old = Snapshot([('a', make_stat()), ('b', make_stat()), ('d', make_stat()),
+                    ('f', make_stat())])
+    new = Snapshot([('b', make_stat(mtime=2)), ('c', make_stat()), ('d', make_stat(mode=0o600)),
+                    ('e', make_stat()), ('g', make_stat())])
+    assert diff_snapshots(old, new) == SnapshotDiff(['c', 'e', 'g'], ['a', 'f'], [], ['d'], ['b'])
@@ -1,6 +1,9 @@
+import errno
+import os
 import platform
+import shutil
 import stat
-from asyncio import Queue, wait_for
+from asyncio import Queue, wait_for, sleep
 from asyncio.tasks import Task, wait
 from pathlib import Path
 
@@ -31,6 +34,7 @@ def event_queue(watcher: FileWatcher):
     watcher.created.connect(queue.put)
     watcher.deleted.connect(queue.put)
     watcher.modified.connect(queue.put)
+    watcher.settled.connect(queue.put)
     return queue
 
 
@@ -91,6 +95,29 @@ async def test_create(event_queue: Queue, testdir: Path):
     assert event.path == Path('test.dat')
 
 
+@pytest.mark.parametrize('watcher', [{FileEventType.create}], indirect=['watcher'])
+@pytest.mark.asyncio
+async def test_create_subtree(event_queue: Queue, testdir: Path, tmpdir2: Path):
+    # Copy a whole tree in at once, so most of it exists before the new directories are watched
+    source = tmpdir2 / 'tree'
+    expected = {Path('tree')}
+    for i in range(3):
+        for j in range(3):
+            source.joinpath(str(i), str(j)).mkdir(parents=True)
+            source.joinpath(str(i), str(j), 'file.dat').write_bytes(b'Hello')
+            expected |= {Path('tree', str(i)), Path('tree', str(i), str(j)),
+                         Path('tree', str(i), str(j), 'file.dat')}
+
+    shutil.copytree(str(source), str(testdir / 'tree'))
+    paths = []
+    while len(paths) < len(expected):
+        event = await wait_for(event_queue.get(), 2)
+        assert event.topic == 'created'
+        paths.append(event.path)
+
+    assert sorted(paths) == sorted(expected)
+
+
 @pytest.mark.asyncio
 async def test_delete(event_queue: Queue, testdir: Path):
     testdir.joinpath('testfile').unlink()
@@ -107,6 +134,25 @@ async def test_modify(event_queue: Queue, testdir: Path):
     assert event.path == Path('testfile')
 
 
+@pytest.mark.parametrize('watcher', [{FileEventType.settle}], indirect=['watcher'])
+@pytest.mark.asyncio
+async def test_settle(event_queue: Queue, testdir: Path, watcher_type):
+    if watcher_type == 'windows':
+        pytest.skip('ReadDirectoryChangesW cannot tell when a file has been closed')
+
+    with testdir.joinpath('test.dat').open('wb') as f:
+        f.write(b'Hello')
+        f.flush()
+        await sleep(0.3)
+        assert event_queue.empty()
+        f.write(b'World')
+
+    event = await wait_for(event_queue.get(), 2)
+    assert event.topic == 'settled'
+    assert event.path == Path('test.dat')
+    assert event_queue.empty()
+
+
 @pytest.mark.asyncio
 async def test_moved_to(event_queue: Queue, testdir: Path, tmpdir2: Path):
     otherfile = tmpdir2 / 'otherfile'
@@ -148,6 +194,21 @@ async def test_existing_subdir_delete(event_queue: Queue, testdir: Path):
     assert event.path == Path('subdir', 'testfile2')
 
 
+@pytest.mark.parametrize('watcher', [{FileEventType.create, FileEventType.delete}],
+                         indirect=['watcher'])
+@pytest.mark.asyncio
+async def test_existing_subdir_rmtree(event_queue: Queue, testdir: Path):
+    """Test that removing a watched directory tree does not break the watcher."""
+    shutil.rmtree(str(testdir / 'subdir'))
+    testdir.joinpath('test.dat').write_bytes(b'Hello')
+    expected = {('deleted', Path('subdir')), ('deleted', Path('subdir', 'testfile2')),
+                ('created', Path('test.dat'))}
+    received = set()
+    while received != expected:
+        event = await wait_for(event_queue.get(), 2)
+        received.add((event.topic, event.path))
+
+
 @pytest.mark.parametrize('watcher', [{FileEventType.create}], indirect=['watcher'])
 @pytest.mark.asyncio
 async def test_existing_subdir_create(event_queue: Queue, testdir: Path, watcher):
@@ -173,3 +234,101 @@ async def test_new_subdir(event_queue: Queue, testdir: Path):
     event = await wait_for(event_queue.get(), 2)
     assert event.topic == 'created'
     assert event.path == Path('newsubdir', 'test.dat')
+
+
+@pytest.mark.parametrize('recursive, expected', [
+    (True, {Path('testfile'), Path('subdir'), Path('subdir', 'testfile2')}),
+    (False, {Path('testfile'), Path('subdir')})
+], ids=['recursive', 'nonrecursive'])
+@pytest.mark.asyncio
+async def test_report_existing(testdir: Path, watcher_type, recursive, expected):
+    kwargs = {'interval': 0.2} if watcher_type == 'poll' else {}
+    try:
+        watcher = create_watcher(testdir, events=FileEventType.all, recursive=recursive,
+                                 backend=watcher_type, report_existing=True, **kwargs)
+    except (ImportError, AttributeError):
+        return pytest.skip('The "%s" watcher is not available on this platform' % watcher_type)
+
+    queue = Queue()
+    watcher.scanned.connect(queue.put)
+    watcher.created.connect(queue.put)
+    watcher.start()
+    try:
+        event = await wait_for(queue.get(), 2)
+        assert event.topic == 'scanned'
+        assert set(event.paths) == expected
+
+        testdir.joinpath('test.dat').write_bytes(b'Hello')
+        event = await wait_for(queue.get(), 2)
+        assert event.topic == 'created'
+        assert event.path == Path('test.dat')
+    finally:
+        watcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_multiple_roots(testdir: Path, tmpdir2: Path, watcher_type):
+    kwargs = {'interval': 0.2} if watcher_type == 'poll' else {}
+    try:
+        watcher = create_watcher([testdir, tmpdir2], events=[FileEventType.create],
+                                 backend=watcher_type, **kwargs)
+    except (ImportError, AttributeError):
+        return pytest.skip('The "%s" watcher is not available on this platform' % watcher_type)
+
+    queue = Queue()
+    watcher.created.connect(queue.put)
+    watcher.start()
+    try:
+        for root in (tmpdir2, testdir):
+            root.joinpath('test.dat').write_bytes(b'Hello')
+            event = await wait_for(queue.get(), 2)
+            assert event.root == root
+            assert event.path == Path('test.dat')
+            assert event.fullpath == root / 'test.dat'
+    finally:
+        watcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_inotify_watch_errors(testdir: Path, caplog):
+    try:
+        watcher = create_watcher(testdir, events=[FileEventType.create], backend='inotify')
+    except (ImportError, AttributeError):
+        return pytest.skip('The "inotify" watcher is not available on this platform')
+
+    watcher.start()
+    try:
+        exc = pytest.raises(OSError, watcher._arm_watch, testdir, testdir / 'missing', 0xfff)
+        assert exc.value.errno == errno.ENOENT
+        assert exc.value.filename == str(testdir / 'missing')
+
+        # A missing directory is silently skipped, but running out of watches is not
+        watcher._watch_new_directory(testdir, Path('missing'))
+        assert not caplog.records
+
+        def arm_watch(root, path, mask):
+            raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), str(path))
+
+        watcher._arm_watch = arm_watch
+        watcher._watch_new_directory(testdir, Path('subdir'))
+        assert [record.getMessage() for record in caplog.records] == [
+            'Could not watch new directory {}: No space left on device'.format(
+                testdir / 'subdir')]
+    finally:
+        watcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_poll_single_file(testdir: Path):
+    path = testdir / 'testfile'
+    watcher = create_watcher(path, events=[FileEventType.modify], backend='poll', interval=0.1)
+    queue = Queue()
+    watcher.modified.connect(queue.put)
+    watcher.start()
+    try:
+        await sleep(0.05)
+        path.write_bytes(b'Hello, world')
+        event = await wait_for(queue.get(), 2)
+        assert event.fullpath == path
+    finally:
+        watcher.stop()